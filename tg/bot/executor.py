@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from wb.wb_api.metrics import registry, Gauge, Histogram
+
+queue_depth = registry.register(Gauge(
+    'bot_update_queue_depth',
+    'Сколько обновлений Telegram ждут обработки'
+))
+queue_wait = registry.register(Histogram(
+    'bot_update_queue_wait_seconds',
+    'Сколько обновление ждало в очереди до начала обработки'
+))
+
+
+class ChatSerializedExecutor:
+    # Обновления разных чатов обрабатываются параллельно в пуле потоков,
+    # а обновления одного чата - строго по очереди, чтобы переходы состояний не перемешивались.
+    # Принятых, но не обработанных обновлений не больше max_pending: дальше submit ждет, и очередь
+    # перед диспетчером (опрос или вебхук) перестает разбираться
+
+    def __init__(
+            self,
+            max_workers: int,
+            on_error: Callable[[Update, Exception], None] | None = None,
+            max_pending: int = 1000
+    ):
+        self.on_error = on_error
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bot-worker')
+        # Очереди чатов, у которых прямо сейчас обрабатывается обновление
+        self._chat_queues: dict[Hashable, deque] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, chat_id: Hashable, func: Callable[[Update, CallbackContext], None],
+               update: Update, context: CallbackContext):
+        self._slots.acquire()
+        task = (time.monotonic(), func, update, context)
+        with self._lock:
+            self._pending += 1
+            queue_depth.set(self._pending)
+            if chat_id in self._chat_queues:
+                self._chat_queues[chat_id].append(task)
+                return
+            self._chat_queues[chat_id] = deque()
+        self._executor.submit(self._run, chat_id, task)
+
+    def _run(self, chat_id: Hashable, task: tuple):
+        submitted_at, func, update, context = task
+        with self._lock:
+            self._pending -= 1
+            queue_depth.set(self._pending)
+        queue_wait.observe(time.monotonic() - submitted_at)
+        try:
+            func(update, context)
+        except Exception as ex:
+            if self.on_error is None:
+                raise
+            self.on_error(update, ex)
+        finally:
+            self._slots.release()
+            # Следующее обновление чата ставим в общий пул, а не выполняем тут же,
+            # чтобы один активный чат не занимал поток надолго
+            with self._lock:
+                chat_queue = self._chat_queues[chat_id]
+                if chat_queue:
+                    self._executor.submit(self._run, chat_id, chat_queue.popleft())
+                else:
+                    del self._chat_queues[chat_id]
+                    if not self._chat_queues:
+                        self._idle.notify_all()
+
+    def wrap(self, func: Callable[[Update, CallbackContext], None]) -> Callable[[Update, CallbackContext], None]:
+        def handler(update: Update, context: CallbackContext):
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            self.submit(chat_id, func, update, context)
+
+        return handler
+
+    def shutdown(self, wait: bool = True):
+        # Очереди чатов продолжают ставить задачи в пул, поэтому сначала ждем, пока они опустеют
+        if wait:
+            with self._idle:
+                self._idle.wait_for(lambda: not self._chat_queues)
+        self._executor.shutdown(wait=wait)
@@ -1,18 +1,27 @@
+import time
+from contextlib import suppress
+
+from django.conf import settings
+from telegram import TelegramError
 from telegram.ext import CallbackContext
 
 from tg.bot.stickers import get_orders_stickers
+from wb import catalog, orders as order_history
 from wb.wb_api import WBApiClient
+from wb.wb_api.deadline import deadline
+from wb.wb_api.metrics import registry, get_shard_dump_path, get_web_dump_path
 
 
 def send_stickers_job(context: CallbackContext):
     supply_id = context.job.context['supply_id']
     wb_client = WBApiClient()
-    orders = wb_client.get_supply_orders(supply_id)
-    order_qr_codes = wb_client.get_qr_codes_for_orders(
-        [order.id for order in orders]
-    )
-    articles = {order.article for order in orders}
-    products = list(wb_client.get_products(articles))
+    with deadline(settings.BOT_JOB_DEADLINE):
+        orders = wb_client.get_supply_orders(supply_id)
+        order_qr_codes = wb_client.get_qr_codes_for_orders(
+            [order.id for order in orders]
+        )
+        articles = {order.article for order in orders}
+        products = catalog.get_products(articles)
 
     with get_orders_stickers(
         orders,
@@ -25,3 +34,69 @@ def send_stickers_job(context: CallbackContext):
             document=zip_file.getvalue(),
             filename=zip_file.name
         )
+
+
+def add_orders_to_supply_job(context: CallbackContext):
+    chat_id = context.job.context['chat_id']
+    supply_id = context.job.context['supply_id']
+    order_ids = context.job.context['order_ids']
+    wb_client = WBApiClient()
+
+    message = context.bot.send_message(
+        chat_id=chat_id,
+        text=f'Добавление заказов в поставку {supply_id}: 0 из {len(order_ids)}'
+    )
+    last_edit_at = time.monotonic()
+
+    def edit_message(text: str):
+        with suppress(TelegramError):
+            context.bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=message.message_id,
+                text=text
+            )
+
+    def show_progress(done: int, total: int):
+        nonlocal last_edit_at
+        # Телеграм не дает часто редактировать сообщение, обновляем не чаще раза в секунду
+        if done < total and time.monotonic() - last_edit_at < 1:
+            return
+        last_edit_at = time.monotonic()
+        edit_message(f'Добавление заказов в поставку {supply_id}: {done} из {total}')
+
+    with deadline(settings.BOT_JOB_DEADLINE):
+        result = wb_client.add_orders_to_supply(supply_id, order_ids, progress=show_progress)
+
+    text = f'Добавлено заказов в поставку {supply_id}: {len(result.succeeded)} из {len(order_ids)}'
+    if result.failed:
+        failed_orders = '\n'.join(
+            f'{order_id}: {error}'
+            for order_id, error in list(result.failed.items())[:20]
+        )
+        text = f'{text}\n\nНе удалось добавить {len(result.failed)}:\n{failed_orders}'
+    edit_message(text)
+
+
+def sync_orders_job(context: CallbackContext):
+    with deadline(settings.BOT_JOB_DEADLINE):
+        order_history.sync_orders()
+
+
+def dump_metrics(shard: int | None = None, web: bool = False):
+    # Шард и веб-процесс вебхука пишут свои файлы с меткой shard или process, адрес /metrics объединяет их
+    if web:
+        registry.dump(get_web_dump_path(settings.WB_METRICS_DUMP_FILE), {'process': 'web'})
+    elif shard is None:
+        registry.dump(settings.WB_METRICS_DUMP_FILE)
+    else:
+        registry.dump(get_shard_dump_path(settings.WB_METRICS_DUMP_FILE, shard), {'shard': shard})
+
+
+def dump_metrics_job(context: CallbackContext):
+    dump_metrics(**context.job.context)
+
+
+def evict_idle_sessions_job(context: CallbackContext):
+    # Чаты, которые долго не писали боту, при следующем обращении начнут с основного меню
+    session_store = context.job.context
+    session_store.evict_idle(settings.BOT_SESSION_MAX_IDLE)
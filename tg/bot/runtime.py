@@ -0,0 +1,88 @@
+import threading
+from queue import Queue, Full
+
+from django.conf import settings
+from telegram import Bot, Update
+from telegram.ext import (
+    Dispatcher,
+    JobQueue,
+    CallbackQueryHandler,
+    MessageHandler,
+    CommandHandler,
+    Filters
+)
+
+from tg.bot import state_machine
+from tg.bot.executor import ChatSerializedExecutor
+from tg.bot.jobs import dump_metrics_job, sync_orders_job, evict_idle_sessions_job
+
+
+def setup_dispatcher(
+        dispatcher: Dispatcher,
+        background_jobs: bool = True,
+        shard: int | None = None,
+        web: bool = False
+) -> ChatSerializedExecutor:
+    # Одинаково для опроса, вебхука и шардов: диспетчер только раскладывает обновления по очередям чатов,
+    # обработка идет в пуле
+    executor = ChatSerializedExecutor(
+        settings.BOT_WORKERS,
+        on_error=dispatcher.dispatch_error,
+        max_pending=settings.BOT_UPDATE_QUEUE_SIZE
+    )
+    process = executor.wrap(state_machine.process)
+    dispatcher.add_handler(CallbackQueryHandler(process))
+    dispatcher.add_handler(MessageHandler(Filters.text, process))
+    dispatcher.add_handler(CommandHandler('start', process))
+    if background_jobs:
+        dispatcher.job_queue.run_repeating(sync_orders_job, interval=settings.WB_ORDERS_SYNC_INTERVAL, first=0)
+        dispatcher.job_queue.run_repeating(
+            evict_idle_sessions_job,
+            interval=60 * 60,
+            first=0,
+            context=state_machine.session_store
+        )
+    # Метрики сохраняет каждый шард и веб-процесс вебхука в свой файл,
+    # иначе их запросы к WB без фоновых задач в них не попадут
+    if settings.WB_METRICS_DUMP_FILE and (background_jobs or shard is not None or web):
+        dispatcher.job_queue.run_repeating(
+            dump_metrics_job,
+            interval=settings.WB_METRICS_DUMP_INTERVAL,
+            context={'shard': shard, 'web': web}
+        )
+    return executor
+
+
+class DispatcherRuntime:
+    # Диспетчер без Updater: обновления в его ограниченную очередь кладет вебхук или роутер шардов,
+    # а разбирает очередь сам диспетчер в своем потоке
+
+    def __init__(
+            self,
+            queue_size: int,
+            background_jobs: bool = True,
+            shard: int | None = None,
+            web: bool = False
+    ):
+        self.bot = Bot(settings.TG_TOKEN)
+        self.job_queue = JobQueue()
+        self.dispatcher = Dispatcher(self.bot, Queue(maxsize=queue_size), job_queue=self.job_queue)
+        self.job_queue.set_dispatcher(self.dispatcher)
+        self.executor = setup_dispatcher(self.dispatcher, background_jobs, shard, web)
+
+    def start(self):
+        self.job_queue.start()
+        threading.Thread(target=self.dispatcher.start, name='bot-dispatcher', daemon=True).start()
+
+    def stop(self):
+        self.job_queue.stop()
+        self.dispatcher.stop()
+        self.executor.shutdown()
+
+    def put(self, data: dict, block: bool = False) -> bool:
+        update = Update.de_json(data, self.bot)
+        try:
+            self.dispatcher.update_queue.put(update, block=block)
+        except Full:
+            return False
+        return True
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .state_machine import Locator
+
+
+def dump_locator(locator: Locator) -> bytes:
+    return json.dumps([locator.state_name, locator.params], separators=(',', ':')).encode()
+
+
+def load_locator(data: bytes) -> Locator | None:
+    # Запись, которую не удалось прочитать, считаем отсутствующей: чат просто вернется в основное меню
+    try:
+        state_name, params = json.loads(data)
+    except ValueError:
+        return None
+    return Locator(state_name, params)
+
+
+class SessionStore(ABC):
+    # Где хранится текущее состояние чата. Хранилище общее для всех процессов бота,
+    # поэтому чат можно обработать в любом из них
+
+    @abstractmethod
+    def get(self, chat_id: int) -> Locator | None:
+        pass
+
+    @abstractmethod
+    def set(self, chat_id: int, locator: Locator):
+        pass
+
+    @abstractmethod
+    def delete(self, chat_id: int):
+        pass
+
+    @abstractmethod
+    def evict_idle(self, max_idle: float) -> int:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    # Только для одного процесса: состояния теряются при перезапуске
+
+    def __init__(self):
+        self._sessions: dict[int, tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int) -> Locator | None:
+        session = self._sessions.get(chat_id)
+        return load_locator(session[0]) if session else None
+
+    def set(self, chat_id: int, locator: Locator):
+        with self._lock:
+            self._sessions[chat_id] = (dump_locator(locator), time.time())
+
+    def delete(self, chat_id: int):
+        with self._lock:
+            self._sessions.pop(chat_id, None)
+
+    def evict_idle(self, max_idle: float) -> int:
+        idle_since = time.time() - max_idle
+        with self._lock:
+            idle_chat_ids = [
+                chat_id
+                for chat_id, (_, updated_at) in self._sessions.items()
+                if updated_at < idle_since
+            ]
+            for chat_id in idle_chat_ids:
+                del self._sessions[chat_id]
+        return len(idle_chat_ids)
+
+
+class SQLiteSessionStore(SessionStore):
+    # Отдельный файл SQLite в режиме WAL: читатели не ждут писателей, а несколько процессов
+    # пишут в него по очереди. Соединение у каждого потока свое
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if (connection := getattr(self._local, 'connection', None)) is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions '
+                '(chat_id INTEGER PRIMARY KEY, locator BLOB NOT NULL, updated_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)')
+            self._local.connection = connection
+        return connection
+
+    def get(self, chat_id: int) -> Locator | None:
+        row = self._connection.execute('SELECT locator FROM sessions WHERE chat_id = ?', (chat_id,)).fetchone()
+        return load_locator(row[0]) if row else None
+
+    def set(self, chat_id: int, locator: Locator):
+        self._connection.execute(
+            'INSERT INTO sessions (chat_id, locator, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (chat_id) DO UPDATE SET locator = excluded.locator, updated_at = excluded.updated_at',
+            (chat_id, dump_locator(locator), time.time())
+        )
+
+    def delete(self, chat_id: int):
+        self._connection.execute('DELETE FROM sessions WHERE chat_id = ?', (chat_id,))
+
+    def evict_idle(self, max_idle: float) -> int:
+        cursor = self._connection.execute('DELETE FROM sessions WHERE updated_at < ?', (time.time() - max_idle,))
+        return cursor.rowcount
+
+
+SESSION_STORES = {
+    'memory': lambda: MemorySessionStore(),
+    'sqlite': lambda: SQLiteSessionStore(settings.BOT_SESSION_DB),
+}
+
+
+def get_session_store() -> SessionStore:
+    # Кроме встроенных хранилищ можно указать путь к своему классу, например myproject.sessions.RedisStore
+    if factory := SESSION_STORES.get(settings.BOT_SESSION_STORE):
+        return factory()
+    return import_string(settings.BOT_SESSION_STORE)()
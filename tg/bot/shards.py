@@ -0,0 +1,91 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import zlib
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from tg.bot.jobs import dump_metrics
+from tg.bot.runtime import DispatcherRuntime
+from tg import shard_worker
+from wb.wb_api import WBApiClient
+
+logger = logging.getLogger(__name__)
+
+
+def get_shard(chat_id: int | None, shards: int) -> int:
+    # crc32 вместо hash(), чтобы номер шарда не зависел от процесса
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+def run_shard(index: int, shards: int, updates: multiprocessing.Queue):
+    # Останавливает шард роутер, отправив None, поэтому Ctrl+C, пришедший всей группе процессов, не нужен
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    WBApiClient().split_between_processes(shards)
+    if settings.WB_API_PREWARM_CONNECTIONS:
+        WBApiClient().warm_up(settings.WB_API_PREWARM_CONNECTIONS)
+
+    # Фоновую синхронизацию выполняет только первый шард
+    runtime = DispatcherRuntime(settings.BOT_UPDATE_QUEUE_SIZE, background_jobs=index == 0, shard=index)
+    runtime.start()
+    while (data := updates.get()) is not None:
+        runtime.put(data, block=True)
+    runtime.stop()
+    if settings.WB_METRICS_DUMP_FILE:
+        dump_metrics(shard=index)
+
+
+class ShardRouter:
+    # Обновления чата всегда уходят в один и тот же процесс, поэтому порядок обработки внутри чата сохраняется,
+    # а разные чаты обрабатываются на разных ядрах
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        # spawn, а не fork: форк процесса с потоками Updater и пулом соединений копирует их состояние и блокировки
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = [self._context.Queue(settings.BOT_UPDATE_QUEUE_SIZE) for _ in range(shards)]
+        self._processes: list[multiprocessing.Process | None] = [None] * shards
+
+    def _start_shard(self, index: int):
+        process = self._context.Process(
+            target=shard_worker.run,
+            args=(index, self.shards, self._queues[index]),
+            name=f'bot-shard-{index}',
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(self.shards):
+            self._start_shard(index)
+
+    def restart_dead_shards(self):
+        # Вызывается из главного потока. Убитый шард мог не отпустить блокировку чтения своей очереди,
+        # поэтому перезапущенный получает новую, а оставшиеся в старой обновления теряются
+        for index, process in enumerate(self._processes):
+            if not process.is_alive():
+                logger.error('Шард %s завершился с кодом %s, перезапускаем', index, process.exitcode)
+                self._queues[index] = self._context.Queue(settings.BOT_UPDATE_QUEUE_SIZE)
+                self._start_shard(index)
+
+    def route(self, update: Update, context: CallbackContext):
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        index = get_shard(chat_id, self.shards)
+        data = update.to_dict()
+        # Очередь упавшего шарда никто не читает, поэтому при заполнении берем ее заново: после перезапуска она новая
+        while True:
+            try:
+                self._queues[index].put(data, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self):
+        for updates in self._queues:
+            updates.put(None)
+        for process in self._processes:
+            process.join()
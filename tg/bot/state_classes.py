@@ -1,3 +1,4 @@
+import json
 from contextlib import suppress
 
 from telegram import (
@@ -10,14 +11,20 @@ from telegram import (
 )
 from telegram.ext import CallbackContext
 
+from wb.wb_api.cache import TTLCache
 from .state_machine import Locator, BaseState
 
+# Снимки данных экранов для листания страниц, по чату, состоянию и параметрам экрана
+page_snapshots = TTLCache(max_size=1024)
+
 
 class ClassicBaseState(BaseState):
     msg_text: str | None = None
     inline_keyboard: list[list[InlineKeyboardButton]] | None = None
     keyboard: list[list[KeyboardButton]] | None = None
     message_sending_params: dict = {}
+    # Сколько секунд листание страниц показывает уже загруженные данные экрана. 0 - загружать при каждом показе
+    snapshot_ttl: float = 0
 
     def __init__(self, state_name: str):
         super().__init__(state_name)
@@ -31,7 +38,10 @@ class ClassicBaseState(BaseState):
     def enter_state(self, update: Update, context: CallbackContext, **params) -> Locator | None:
         self.update = update
         self.context = context
-        self.state_data = params | self.get_state_data(**params)
+        state_data = self.load_state_data(params)
+        if state_data is None:
+            return self.on_missing_state_data(params)
+        self.state_data = params | state_data
         self.msg_text = self.get_msg_text()
         self.inline_keyboard = self.get_inline_keyboard()
         self.keyboard = self.get_keyboard()
@@ -50,6 +60,26 @@ class ClassicBaseState(BaseState):
     def get_state_data(self, **params) -> dict:
         return params
 
+    def on_missing_state_data(self, params: dict) -> Locator | None:
+        # get_state_data вернул None: показывать нечего, например объект уже удален.
+        # Состояние может вернуть пользователя на другой экран
+        raise LookupError(f'Нет данных для состояния {self.state_name}: {params}')
+
+    def load_state_data(self, params: dict) -> dict:
+        # Данные загружаются при входе на экран, а переход на другую страницу (в параметрах есть page_number)
+        # только заново режет их снимок
+        if not self.snapshot_ttl:
+            return self.get_state_data(**params)
+        screen_params = {name: value for name, value in params.items() if name != 'page_number'}
+        key = (self.update.effective_chat.id, self.state_name, json.dumps(screen_params, sort_keys=True, default=str))
+        if 'page_number' in params:
+            found, state_data = page_snapshots.get(key)
+            if found:
+                return state_data
+        state_data = self.get_state_data(**params)
+        page_snapshots.set(key, state_data, self.snapshot_ttl)
+        return state_data
+
     def process(self, update: Update, context: CallbackContext, params) -> Locator | None:
         self.state_data = params
         self.update = update
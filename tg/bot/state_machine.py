@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import Type, NamedTuple
+from contextlib import nullcontext
+from typing import Type, NamedTuple, Callable, ContextManager, TYPE_CHECKING
 
 from telegram import Update  # noqa
 from telegram.ext import CallbackContext  # noqa
 
+if TYPE_CHECKING:
+    from .sessions import SessionStore
+
 
 class Locator(NamedTuple):
     state_name: str
@@ -11,6 +15,9 @@ class Locator(NamedTuple):
 
 
 class BaseState(ABC):
+    # Какие параметры сохраняются между обновлениями: идентификаторы и номера страниц.
+    # Все остальное состояние получает заново при входе, из кэшей клиента WB и зеркал
+    stored_params: tuple[str, ...] = ()
 
     def __init__(self, state_name: str):
         self.state_name = state_name
@@ -28,49 +35,72 @@ class BaseState(ABC):
         pass
 
 
-class StateMachine(dict[str, BaseState]):
-
-    def __init__(self, *, start_state_locator: Locator, commands_map: dict):
+class StateMachine(dict[str, Type[BaseState]]):
+    # Хранит классы состояний. На каждое обновление создается свой экземпляр состояния,
+    # а update и context передаются по цепочке вызовов, поэтому обновления разных чатов
+    # можно обрабатывать одновременно. Текущее состояние чата лежит в session_store, а не в user_data,
+    # чтобы его видели все процессы бота
+
+    def __init__(
+            self,
+            *,
+            start_state_locator: Locator,
+            commands_map: dict,
+            session_store: 'SessionStore',
+            action_context: Callable[[], ContextManager] = nullcontext
+    ):
         super().__init__()
         self.commands_map = commands_map
         self.start_state_locator = start_state_locator
-        self.update = None
-        self.context = None
+        self.session_store = session_store
+        self.action_context = action_context
 
     def register(self, state_name: str):
         def decorator(cls: Type[BaseState]):
-            self[state_name] = cls(state_name)
+            self[state_name] = cls
+            return cls
 
         return decorator
 
+    def create_state(self, state_name: str) -> BaseState:
+        return self[state_name](state_name)
+
+    def compact(self, locator: Locator) -> Locator:
+        stored_params = self[locator.state_name].stored_params
+        return Locator(
+            locator.state_name,
+            {name: value for name, value in locator.params.items() if name in stored_params}
+        )
+
     def process(self, update: Update, context: CallbackContext):
-        self.update = update
-        self.context = context
+        with self.action_context():
+            self._process(update, context)
 
+    def _process(self, update: Update, context: CallbackContext):
         if update.message and update.message.text in self.commands_map:
             state_locator = self.commands_map[update.message.text]
-            self.switch_state(state_locator)
+            self.switch_state(update, context, state_locator)
             return
 
-        locator = context.user_data.get('locator')
+        locator = self.session_store.get(update.effective_chat.id)
 
         if not locator:
-            self.switch_state(self.start_state_locator)
+            self.switch_state(update, context, self.start_state_locator)
             return
         else:
-            state = self.get(locator.state_name)
-            next_state_locator = state.process(self.update, self.context, locator.params)
+            state = self.create_state(locator.state_name)
+            next_state_locator = state.process(update, context, locator.params)
 
         if not next_state_locator:
             return
 
-        if locator != next_state_locator:
+        if locator != self.compact(next_state_locator):
             state.exit_state(update, context)
 
-        self.switch_state(next_state_locator)
+        self.switch_state(update, context, next_state_locator)
 
-    def switch_state(self, next_state_locator: Locator):
-        next_state = self.get(next_state_locator.state_name)
-        if locator := next_state.enter_state(self.update, self.context, **next_state_locator.params):
+    def switch_state(self, update: Update, context: CallbackContext, next_state_locator: Locator):
+        next_state = self.create_state(next_state_locator.state_name)
+        if locator := next_state.enter_state(update, context, **next_state_locator.params):
             next_state_locator = locator
-        self.context.user_data['locator'] = next_state_locator
+        self.session_store.set(update.effective_chat.id, self.compact(next_state_locator))
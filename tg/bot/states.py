@@ -1,23 +1,29 @@
+import zlib
 from collections import Counter
 from contextlib import suppress
 
 from django.conf import settings
-from telegram import Update, InlineKeyboardButton  # noqa
+from telegram import Update, InlineKeyboardButton, TelegramError  # noqa
 from telegram.ext import CallbackContext  # noqa
 
+from wb import supplies as supply_mirror, orders as order_history
 from wb.wb_api import WBApiClient
-from wb.wb_api.helpers import filter_supplies, SupplyFilter
-from .jobs import send_stickers_job
+from wb.wb_api.deadline import deadline
+from wb.wb_api.helpers import SupplyFilter
+from .jobs import send_stickers_job, add_orders_to_supply_job
 from .state_machine import StateMachine, Locator
 from .state_classes import OmniMessageBaseState
 from .paginator import Paginator
+from .sessions import get_session_store
 from .stickers import get_supply_sticker
 
 state_machine = StateMachine(
     start_state_locator=Locator('MAIN_MENU'),
     commands_map={
         '/start': Locator('MAIN_MENU')
-    }
+    },
+    session_store=get_session_store(),
+    action_context=lambda: deadline(settings.BOT_ACTION_DEADLINE)
 )
 _MAIN_MENU_INLINE_BUTTON = [InlineKeyboardButton('Основное меню', callback_data='start')]
 wb_client = WBApiClient()
@@ -46,6 +52,8 @@ class MainMenuState(OmniMessageBaseState):
 
 @state_machine.register('NEW_ORDERS')
 class NewOrdersState(OmniMessageBaseState):
+    stored_params = ('page_number',)
+    snapshot_ttl = settings.BOT_PAGE_SNAPSHOT_TTL
 
     def get_state_data(self, **params) -> dict:
         new_orders = wb_client.get_new_orders()
@@ -93,13 +101,13 @@ class NewOrdersState(OmniMessageBaseState):
 
 @state_machine.register('SUPPLIES')
 class SuppliesState(OmniMessageBaseState):
+    stored_params = ('only_active', 'page_number')
+    snapshot_ttl = settings.BOT_PAGE_SNAPSHOT_TTL
 
     def get_state_data(self, **params) -> dict:
         only_active = params.get('only_active', True)
 
-        supplies = filter_supplies(SupplyFilter.ACTIVE if only_active else SupplyFilter.ALL)
-        supplies.sort(key=lambda s: s.created_at, reverse=True)
-
+        supplies = supply_mirror.get_supplies(SupplyFilter.ACTIVE if only_active else SupplyFilter.ALL)
         return {'supplies': supplies}
 
     def get_msg_text(self) -> str:
@@ -158,6 +166,7 @@ class SuppliesState(OmniMessageBaseState):
 
 @state_machine.register('SUPPLY')
 class SupplyState(OmniMessageBaseState):
+    stored_params = ('supply_id',)
 
     def get_state_data(self, **params) -> dict:
         supply_id = params['supply_id']
@@ -204,6 +213,7 @@ class SupplyState(OmniMessageBaseState):
 
         buttons = {
             'stickers': 'Создать стикеры',
+            'add_orders': 'Добавить новые заказы',
             'edit': 'Редактировать заказы',
             'close': 'Отправить в доставку',
             'delete': 'Удалить поставку',
@@ -213,9 +223,9 @@ class SupplyState(OmniMessageBaseState):
 
         match supply.is_done, orders:
             case False, orders if orders:
-                case_buttons = ['stickers', 'edit', 'close', 'supplies']
+                case_buttons = ['stickers', 'add_orders', 'edit', 'close', 'supplies']
             case False, orders if not orders:
-                case_buttons = ['delete', 'supplies']
+                case_buttons = ['add_orders', 'delete', 'supplies']
             case _:
                 case_buttons = ['stickers', 'qr', 'supplies']
 
@@ -248,6 +258,7 @@ class SupplyState(OmniMessageBaseState):
                 self.update.callback_query.id,
                 'Отправлено в доставку'
             )
+            supply_mirror.refresh_supply(self.state_data['supply_id'])
             self.send_supply_qr_code()
 
     def delete_supply(self):
@@ -261,6 +272,7 @@ class SupplyState(OmniMessageBaseState):
                 self.update.callback_query.id,
                 'Поставка удалена'
             )
+            supply_mirror.refresh_supply(self.state_data['supply_id'])
         return Locator('SUPPLIES')
 
     def send_supply_qr_code(self):
@@ -276,6 +288,8 @@ class SupplyState(OmniMessageBaseState):
         match query:
             case 'stickers':
                 self.send_stickers()
+            case 'add_orders':
+                return Locator('BULK_ADD_ORDERS', {'supply_id': self.state_data['supply_id']})
             case 'edit':
                 return Locator('EDIT_SUPPLY', self.state_data)
             case 'close':
@@ -291,6 +305,132 @@ class SupplyState(OmniMessageBaseState):
                 return Locator('MAIN_MENU')
 
 
+@state_machine.register('BULK_ADD_ORDERS')
+class BulkAddOrdersState(OmniMessageBaseState):
+    stored_params = ('supply_id', 'mode', 'page_number', 'selected_order_ids', 'orders_key')
+
+    def get_state_data(self, **params) -> dict:
+        new_orders = sorted(wb_client.get_new_orders(), key=lambda o: o.created_at)
+        articles = sorted(Counter(order.article for order in new_orders).items())
+        # Отпечаток показанного списка: кнопки ссылаются на позиции в нем, поэтому нажатие принимается,
+        # только если список новых заказов с тех пор не изменился
+        orders_key = zlib.crc32(','.join(str(order.id) for order in new_orders).encode())
+        return {'new_orders': new_orders, 'articles': articles, 'orders_key': orders_key}
+
+    def get_msg_text(self) -> str:
+        new_orders = self.state_data['new_orders']
+        selected_order_ids = self.state_data.get('selected_order_ids', [])
+
+        if not new_orders:
+            return 'Нет новых заказов'
+
+        text = f'Новые заказы - {len(new_orders)} шт.\n' \
+               f'Выберите, какие добавить в поставку {self.state_data["supply_id"]}'
+        if selected_order_ids:
+            text = f'{text}\n\nВыбрано заказов: {len(selected_order_ids)}'
+        return text
+
+    def get_inline_keyboard(self) -> list[list[InlineKeyboardButton]]:
+        new_orders = self.state_data['new_orders']
+        articles = self.state_data['articles']
+        selected_order_ids = self.state_data.get('selected_order_ids', [])
+        page_number = self.state_data.get('page_number', 1)
+        keyboard = []
+
+        if new_orders:
+            keyboard.append([InlineKeyboardButton(f'Все новые заказы - {len(new_orders)}шт.', callback_data='all')])
+            if self.state_data.get('mode') == 'orders':
+                paginator = Paginator(
+                    new_orders,
+                    button_text_getter=lambda o: f'✅ {o}' if o.id in selected_order_ids else str(o),
+                    button_callback_data_getter=lambda o: f'order#{o.id}',
+                    page_size=settings.BOT_PAGINATOR_PAGE_SIZE
+                )
+                keyboard.extend(paginator.get_keyboard(page_number=page_number))
+                if selected_order_ids:
+                    keyboard.append([InlineKeyboardButton(
+                        f'Добавить выбранные - {len(selected_order_ids)}шт.',
+                        callback_data='add_selected'
+                    )])
+                keyboard.append([InlineKeyboardButton('Выбрать по артикулам', callback_data='mode#articles')])
+            else:
+                paginator = Paginator(
+                    list(enumerate(articles)),
+                    button_text_getter=lambda a: f'{a[1][0]} - {a[1][1]}шт.',
+                    button_callback_data_getter=lambda a: f'article#{a[0]}',
+                    page_size=settings.BOT_PAGINATOR_PAGE_SIZE
+                )
+                keyboard.extend(paginator.get_keyboard(page_number=page_number))
+                keyboard.append([InlineKeyboardButton('Выбрать отдельные заказы', callback_data='mode#orders')])
+
+        keyboard.append([InlineKeyboardButton('Вернуться к поставке', callback_data='supply')])
+        keyboard.append(_MAIN_MENU_INLINE_BUTTON)
+        return keyboard
+
+    def add_orders(self, order_ids: list[int]) -> Locator:
+        self.context.bot.answer_callback_query(
+            self.update.callback_query.id,
+            f'Заказы добавляются в поставку - {len(order_ids)}шт.'
+        )
+        job_context = {
+            'chat_id': self.update.effective_chat.id,
+            'supply_id': self.state_data['supply_id'],
+            'order_ids': order_ids,
+        }
+        self.context.job_queue.run_once(add_orders_to_supply_job, when=0, context=job_context)
+        return Locator('SUPPLY', {'supply_id': self.state_data['supply_id']})
+
+    def reject_outdated_list(self) -> Locator:
+        # Заказы пришли или разобраны после показа экрана: ничего не добавляем и показываем список заново
+        self.context.bot.answer_callback_query(
+            self.update.callback_query.id,
+            'Список новых заказов изменился, выберите заново'
+        )
+        new_order_ids = {order.id for order in self.state_data['new_orders']}
+        self.state_data['selected_order_ids'] = [
+            order_id for order_id in self.state_data.get('selected_order_ids', []) if order_id in new_order_ids
+        ]
+        self.state_data['page_number'] = 1
+        return Locator(self.state_name, self.state_data)
+
+    def react_on_inline_keyboard(self) -> Locator | None:
+        query = self.update.callback_query.data
+        # Между обновлениями хранятся только выбранные заказы, режим и отпечаток списка, сами заказы берем из кэша клиента
+        shown_orders_key = self.state_data.get('orders_key')
+        self.state_data |= self.get_state_data(**self.state_data)
+        new_orders = self.state_data['new_orders']
+        if query in ('all', 'add_selected') or query.startswith('article'):
+            if shown_orders_key != self.state_data['orders_key']:
+                return self.reject_outdated_list()
+        match query:
+            case 'all':
+                return self.add_orders([order.id for order in new_orders])
+            case query if query.startswith('article'):
+                article, _ = self.state_data['articles'][int(query.split('#')[-1])]
+                return self.add_orders([order.id for order in new_orders if order.article == article])
+            case query if query.startswith('order'):
+                order_id = int(query.split('#')[-1])
+                selected_order_ids = self.state_data.setdefault('selected_order_ids', [])
+                if order_id in selected_order_ids:
+                    selected_order_ids.remove(order_id)
+                else:
+                    selected_order_ids.append(order_id)
+                return Locator(self.state_name, self.state_data)
+            case 'add_selected':
+                return self.add_orders(self.state_data['selected_order_ids'])
+            case query if query.startswith('mode'):
+                self.state_data['mode'] = query.split('#')[-1]
+                self.state_data['page_number'] = 1
+                return Locator(self.state_name, self.state_data)
+            case query if query.startswith('page'):
+                self.state_data['page_number'] = int(query.split('#')[-1])
+                return Locator(self.state_name, self.state_data)
+            case 'supply':
+                return Locator('SUPPLY', {'supply_id': self.state_data['supply_id']})
+            case 'start':
+                return Locator('MAIN_MENU')
+
+
 @state_machine.register('NEW_SUPPLY')
 class NewSupplyState(OmniMessageBaseState):
     msg_text = 'Пришлите название для новой поставки'
@@ -301,7 +441,8 @@ class NewSupplyState(OmniMessageBaseState):
 
     def react_on_message(self) -> Locator | None:
         new_supply_name = self.update.message.text
-        wb_client.create_new_supply(new_supply_name)
+        supply_id = wb_client.create_new_supply(new_supply_name)
+        supply_mirror.refresh_supply(supply_id)
         return Locator('SUPPLIES')
 
     def react_on_inline_keyboard(self) -> Locator | None:
@@ -315,25 +456,33 @@ class NewSupplyState(OmniMessageBaseState):
 
 @state_machine.register('EDIT_SUPPLY')
 class EditSupplyState(OmniMessageBaseState):
+    stored_params = ('supply_id', 'page_number')
+    snapshot_ttl = settings.BOT_PAGE_SNAPSHOT_TTL
 
     def get_state_data(self, **params) -> dict:
-        orders = wb_client.get_supply_orders(params['supply_id'])
-        order_ids = {order.id for order in orders}
+        orders = sorted(wb_client.get_supply_orders(params['supply_id']), key=lambda o: o.created_at)
+        order_ids = [order.id for order in orders]
 
-        if params.get('order_ids') == order_ids:
-            qr_codes = params['qr_codes']
-        else:
+        # Стикеры уже открытых заказов лежат в кэше на диске, предупреждаем только о загрузке новых
+        sticker_cache = wb_client.sticker_cache
+        if sticker_cache is None or not all(sticker_cache.contains(order_id) for order_id in order_ids):
             self.context.bot.answer_callback_query(
                 self.update.callback_query.id,
                 'Загружаются данные по заказам. Подождите'
             )
-            sorted_orders = sorted(orders, key=lambda o: o.created_at)
-            qr_codes = wb_client.get_qr_codes_for_orders([order.id for order in sorted_orders])
-
-        params['order_ids'] = order_ids
-        params['qr_codes'] = qr_codes
-
-        return params
+        qr_codes = {qr_code.order_id: qr_code for qr_code in wb_client.get_qr_codes_for_orders(order_ids)}
+
+        # Снимок экрана хранится для листания страниц, поэтому в нем только то, что выводится на кнопки,
+        # без изображений стикеров
+        rows = []
+        for order in orders:
+            qr_code = qr_codes.get(order.id)
+            rows.append({
+                'id': order.id,
+                'article': order.article,
+                'sticker': f'{qr_code.part_a} {qr_code.part_b}' if qr_code else None
+            })
+        return {'orders': rows}
 
     def get_msg_text(self) -> str:
         orders = self.state_data['orders']
@@ -344,24 +493,19 @@ class EditSupplyState(OmniMessageBaseState):
 
     def get_inline_keyboard(self) -> list[list[InlineKeyboardButton]]:
         orders = self.state_data['orders']
-        qr_codes = self.state_data['qr_codes']
         page_number = self.state_data.get('page_number', 1)
 
         keyboard = [[InlineKeyboardButton('Вернуться к поставке', callback_data='supply')]]
 
         def button_text_getter(order):
-            with suppress(StopIteration):
-                qr_code = next(filter(
-                    lambda qr: qr.order_id == order.id,
-                    qr_codes
-                ))
-                return f'{order.article} | {qr_code.part_a} {qr_code.part_b}'
-            return order.article
+            if order['sticker']:
+                return f'{order["article"]} | {order["sticker"]}'
+            return order['article']
 
         paginator = Paginator(
             orders,
             button_text_getter=button_text_getter,
-            button_callback_data_getter=lambda o: o.id,
+            button_callback_data_getter=lambda o: o['id'],
             page_size=settings.BOT_PAGINATOR_PAGE_SIZE
         )
         paginator_keyboard = paginator.get_keyboard(page_number=page_number, )
@@ -393,12 +537,14 @@ class CheckWaitingOrdersState(OmniMessageBaseState):
     inline_keyboard = [_MAIN_MENU_INLINE_BUTTON]
 
     def get_state_data(self, **params) -> dict:
-        supplies = filter_supplies(SupplyFilter.CLOSED)[::-1]
-        orders = []
-        for supply in supplies[:10]:
-            orders.extend(
-                wb_client.get_supply_orders(supply.id)
-            )
+        supplies = supply_mirror.get_supplies(SupplyFilter.CLOSED, limit=10)
+        # Состав закрытых поставок уже не меняется, поэтому берем его из локальной истории заказов.
+        # У WB запрашиваем только поставки, состав которых еще не перечитан в историю после закрытия
+        synced_supply_ids = order_history.get_synced_supply_ids([supply.id for supply in supplies])
+        orders = order_history.get_orders(supply_ids=list(synced_supply_ids))
+        for supply in supplies:
+            if supply.id not in synced_supply_ids:
+                orders.extend(wb_client.get_supply_orders(supply.id))
 
         order_statuses = wb_client.check_orders_status(
             [order.id for order in orders]
@@ -434,6 +580,7 @@ class CheckWaitingOrdersState(OmniMessageBaseState):
 
 @state_machine.register('ORDER_DETAILS')
 class OrderDetailsState(OmniMessageBaseState):
+    stored_params = ('supply_id', 'order_id')
     message_sending_params = {'parse_mode': 'HTML'}
 
     def get_state_data(self, **params) -> dict | None:
@@ -452,6 +599,24 @@ class OrderDetailsState(OmniMessageBaseState):
                 if order.id == order_id:
                     return {'order': order}
 
+    def on_missing_state_data(self, params: dict) -> Locator | None:
+        # Список, из которого выбран заказ, мог быть снимком: за это время заказ разобрали или перенесли.
+        # Возвращаем к обновленному списку
+        if supply_id := params.get('supply_id'):
+            locator = Locator('EDIT_SUPPLY', {'supply_id': supply_id})
+        else:
+            locator = Locator('NEW_ORDERS')
+        next_state = state_machine.create_state(locator.state_name)
+        locator = next_state.enter_state(self.update, self.context, **locator.params) or locator
+        # Экран поставки мог уже ответить на нажатие сообщением о загрузке стикеров
+        if self.update.callback_query:
+            with suppress(TelegramError):
+                self.context.bot.answer_callback_query(
+                    self.update.callback_query.id,
+                    'Заказа уже нет в этом списке, список обновлен'
+                )
+        return locator
+
     def get_inline_keyboard(self) -> list[list[InlineKeyboardButton]]:
         keyboard = [
             [InlineKeyboardButton('Перенести в поставку', callback_data='add_to_supply')]
@@ -496,10 +661,11 @@ class OrderDetailsState(OmniMessageBaseState):
 
 @state_machine.register('ADD_ORDER_TO_SUPPLY')
 class AddOrderToSupplyState(OmniMessageBaseState):
+    stored_params = ('order_id',)
     msg_text = 'Выберите поставку из существующих либо сообщением пришлите название новой поставки'
 
     def get_inline_keyboard(self) -> list[list[InlineKeyboardButton]]:
-        active_supplies = filter_supplies(SupplyFilter.ACTIVE)
+        active_supplies = supply_mirror.get_supplies(SupplyFilter.ACTIVE)
         keyboard = [
             [InlineKeyboardButton(str(supply), callback_data=supply.id)]
             for supply in active_supplies
@@ -525,6 +691,7 @@ class AddOrderToSupplyState(OmniMessageBaseState):
     def react_on_message(self) -> Locator | None:
         new_supply_name = self.update.message.text
         supply_id = wb_client.create_new_supply(new_supply_name)
+        supply_mirror.refresh_supply(supply_id)
         self.add_to_supply(supply_id)
         return Locator('SUPPLY', {'supply_id': supply_id})
 
@@ -0,0 +1,46 @@
+import atexit
+import threading
+
+from django.conf import settings
+
+from tg.bot.jobs import dump_metrics
+from tg.bot.runtime import DispatcherRuntime
+from wb.wb_api import WBApiClient
+from wb.wb_api.metrics import registry, Counter
+
+# С WB в режиме вебхука работают веб-процесс и start_bot --jobs, лимиты запросов делятся между ними
+WEBHOOK_PROCESSES = 2
+
+webhook_updates = registry.register(Counter(
+    'bot_webhook_updates_total',
+    'Обновления, пришедшие на вебхук: принятые и отклоненные из-за переполненной очереди',
+    ('result',)
+))
+
+_runtime: DispatcherRuntime | None = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> DispatcherRuntime:
+    # В режиме вебхука бот работает внутри веб-процесса. Запускаем его при первом обновлении,
+    # чтобы веб-процесс без вебхука не поднимал бота. Фоновые задачи выполняет отдельный start_bot --jobs
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            WBApiClient().split_between_processes(WEBHOOK_PROCESSES)
+            _runtime = DispatcherRuntime(settings.BOT_UPDATE_QUEUE_SIZE, background_jobs=False, web=True)
+            _runtime.start()
+            atexit.register(_runtime.stop)
+            if settings.WB_METRICS_DUMP_FILE:
+                atexit.register(dump_metrics, web=True)
+        return _runtime
+
+
+def put_update(data: dict) -> bool:
+    # Запрос только кладет обновление в очередь и сразу отвечает Telegram.
+    # Если очередь заполнена, Telegram повторит обновление позже, не получив успешный ответ
+    if get_runtime().put(data):
+        webhook_updates.inc(result='accepted')
+        return True
+    webhook_updates.inc(result='rejected')
+    return False
@@ -0,0 +1,206 @@
+import json
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from tg.bot import state_machine
+from wb.models import Supply, Product, SyncCheckpoint
+from wb.stand_in import SyntheticAccount, WBStandInServer, Faults
+from wb.wb_api import WBApiClient
+from wb.wb_api.helpers import SupplyFilter, filter_supplies
+from wb.wb_api.rate_limiter import RateLimiter, DEFAULT_RATE_LIMITS
+from wb.wb_api.sticker_cache import StickerCache
+
+# Размеры синтетического кабинета: поставки, заказы в истории, новые заказы, карточки товаров
+ACCOUNT_SIZES = {
+    'small': {'supplies': 100, 'orders': 1_000, 'new_orders': 20, 'articles': 100},
+    'medium': {'supplies': 1_000, 'orders': 10_000, 'new_orders': 100, 'articles': 1_000},
+    'large': {'supplies': 5_000, 'orders': 100_000, 'new_orders': 500, 'articles': 5_000},
+}
+
+
+def get_percentile(sorted_values: list[float], percent: int) -> float:
+    index = max(0, round(len(sorted_values) * percent / 100) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def get_peak_memory_mb(action: Callable, concurrency: int) -> float:
+    # Пик памяти, выделенной за одновременные действия сценария. RSS процесса за все время не подходит:
+    # он только растет и показывает самый тяжелый из уже пройденных сценариев.
+    # tracemalloc замедляет код, поэтому память меряется отдельным прогоном после замера времени
+    tracemalloc.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: action(), range(concurrency)))
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = 'Замеряет клиент WB и получение данных состояниями бота на локальной заглушке WB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', choices=ACCOUNT_SIZES, default=['small', 'medium'])
+        parser.add_argument('--iterations', type=int, default=5, help='Сколько раз выполнить каждое действие')
+        parser.add_argument('--concurrency', type=int, default=1, help='Сколько действий выполнять одновременно')
+        parser.add_argument('--scenarios', nargs='+', help='Запустить только эти сценарии')
+        parser.add_argument('--latency', type=float, default=0., help='Задержка ответов заглушки, секунды')
+        parser.add_argument('--jitter', type=float, default=0., help='Разброс задержки, секунды')
+        parser.add_argument(
+            '--keep-rate-limits',
+            action='store_true',
+            help='Не отключать лимиты запросов клиента, по умолчанию замеряется только наш код'
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON, чтобы сравнивать с ними следующие замеры')
+        parser.add_argument('--baseline', help='JSON с результатами прошлого замера для сравнения')
+
+    def handle(self, *args, **options):
+        baseline = json.loads(Path(options['baseline']).read_text()) if options['baseline'] else {}
+        results = {}
+
+        # Зеркала поставок и каталога пишутся в отдельную временную базу, а не в рабочую
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp_dir) / 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                for size in options['sizes']:
+                    results[size] = self.run_size(size, options, Path(tmp_dir))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.print_results(results, baseline)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, ensure_ascii=False, indent=2))
+
+    def run_size(self, size: str, options: dict, tmp_dir: Path) -> dict:
+        started_at = time.perf_counter()
+        account = SyntheticAccount(**ACCOUNT_SIZES[size])
+        self.stdout.write(f'{size}: кабинет сгенерирован за {time.perf_counter() - started_at:.1f} сек.')
+
+        server = WBStandInServer(
+            ('127.0.0.1', 0),
+            account,
+            Faults(latency=options['latency'], jitter=options['jitter'])
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        wb_client = WBApiClient()
+        wb_client.base_url = server.base_url
+        wb_client.response_cache.clear()
+        # Синтетические стикеры не должны попасть в кэш на диске рабочего бота
+        sticker_cache = wb_client.sticker_cache
+        wb_client.sticker_cache = StickerCache(tmp_dir / f'stickers_{size}')
+        if not options['keep_rate_limits']:
+            wb_client.rate_limiter = RateLimiter({group: 10 ** 9 for group in DEFAULT_RATE_LIMITS})
+        for model in (Supply, Product, SyncCheckpoint):
+            model.objects.all().delete()
+
+        try:
+            results = {}
+            for name, action in self.get_scenarios(account).items():
+                if options['scenarios'] and name not in options['scenarios']:
+                    continue
+                results[name] = self.measure(action, server, wb_client, options['iterations'], options['concurrency'])
+            return results
+        finally:
+            wb_client.sticker_cache = sticker_cache
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def get_scenarios(account: SyntheticAccount) -> dict[str, Callable]:
+        wb_client = WBApiClient()
+        open_supply_id = next(
+            (supply_id for supply_id, supply in reversed(account.supplies.items()) if not supply['done']),
+            None
+        )
+        supply_id = max(account.supply_orders, key=lambda s: len(account.supply_orders[s]))
+        order_id = account.supply_orders[supply_id][0]
+        new_order_ids = sorted(account.new_order_ids)[:100]
+        # Состояния получают данные без Telegram, поэтому вместо бота подставляем пустышку
+        stub_context = SimpleNamespace(bot=SimpleNamespace(answer_callback_query=lambda *args, **kwargs: None))
+        stub_update = SimpleNamespace(callback_query=SimpleNamespace(id='0'))
+
+        def get_state_data(state_name: str, **params) -> Callable:
+            def action():
+                state = state_machine.create_state(state_name)
+                state.update, state.context = stub_update, stub_context
+                return state.get_state_data(**params)
+            return action
+
+        return {
+            'client.get_supplies': lambda: wb_client.get_supplies(),
+            'client.iter_supplies': lambda: list(wb_client.iter_supplies()),
+            'client.iter_orders': lambda: sum(1 for _ in wb_client.iter_orders(limit=1000)),
+            'client.iter_orders_stream': lambda: sum(1 for _ in wb_client.iter_orders(limit=1000, stream=True)),
+            'client.get_new_orders': lambda: wb_client.get_new_orders(),
+            'client.get_supply_orders': lambda: wb_client.get_supply_orders(supply_id),
+            'client.get_qr_codes_for_orders': lambda: wb_client.get_qr_codes_for_orders(new_order_ids),
+            'client.check_orders_status': lambda: list(wb_client.check_orders_status(new_order_ids)),
+            'client.iter_product_cards': lambda: sum(1 for _ in wb_client.iter_product_cards(stream=True)),
+            'filter_supplies.active': lambda: filter_supplies(SupplyFilter.ACTIVE),
+            'state.SUPPLIES': get_state_data('SUPPLIES', only_active=True),
+            'state.SUPPLIES.all': get_state_data('SUPPLIES', only_active=False),
+            'state.SUPPLY': get_state_data('SUPPLY', supply_id=supply_id),
+            'state.NEW_ORDERS': get_state_data('NEW_ORDERS'),
+            'state.BULK_ADD_ORDERS': get_state_data('BULK_ADD_ORDERS', supply_id=open_supply_id),
+            'state.EDIT_SUPPLY': get_state_data('EDIT_SUPPLY', supply_id=supply_id),
+            'state.CHECK_WAITING_ORDERS': get_state_data('CHECK_WAITING_ORDERS'),
+            'state.ORDER_DETAILS': get_state_data('ORDER_DETAILS', supply_id=supply_id, order_id=order_id),
+        }
+
+    @staticmethod
+    def measure(action: Callable, server: WBStandInServer, wb_client: WBApiClient, iterations: int,
+                concurrency: int) -> dict:
+        def timed_action(_) -> float:
+            # Каждое действие замеряется без кэшей ответов и стикеров, как первое обращение пользователя
+            wb_client.response_cache.clear()
+            wb_client.sticker_cache.clear()
+            action_started_at = time.perf_counter()
+            action()
+            return time.perf_counter() - action_started_at
+
+        server.pop_request_counts()
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = sorted(executor.map(timed_action, range(iterations)))
+        elapsed = time.perf_counter() - started_at
+        request_counts = server.pop_request_counts()
+        wb_client.response_cache.clear()
+        wb_client.sticker_cache.clear()
+        peak_memory_mb = get_peak_memory_mb(action, concurrency)
+        server.pop_request_counts()
+        return {
+            'p50': get_percentile(latencies, 50),
+            'p95': get_percentile(latencies, 95),
+            'p99': get_percentile(latencies, 99),
+            'throughput': iterations / elapsed,
+            'requests_per_action': sum(request_counts.values()) / iterations,
+            'requests': dict(request_counts),
+            'peak_memory_mb': peak_memory_mb,
+        }
+
+    def print_results(self, results: dict, baseline: dict):
+        header = f'{"сценарий":<32}{"запр./действие":>15}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}' \
+                 f'{"действий/с":>12}{"память, МБ":>12}'
+        for size, size_results in results.items():
+            self.stdout.write(f'\n{size}\n{header}')
+            for name, result in size_results.items():
+                line = f'{name:<32}{result["requests_per_action"]:>15.1f}' \
+                       f'{result["p50"] * 1000:>10.1f}{result["p95"] * 1000:>10.1f}{result["p99"] * 1000:>10.1f}' \
+                       f'{result["throughput"]:>12.2f}{result["peak_memory_mb"]:>12.1f}'
+                if baseline_result := baseline.get(size, {}).get(name):
+                    change = (result['p95'] / baseline_result['p95'] - 1) * 100 if baseline_result['p95'] else 0
+                    line = f'{line}  p95 {change:+.0f}%'
+                    if change > 10:
+                        line = self.style.WARNING(line)
+                self.stdout.write(line)
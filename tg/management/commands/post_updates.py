@@ -0,0 +1,48 @@
+import json
+import time
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+
+def read_updates(path: Path) -> list[dict]:
+    # Файл с одним обновлением, со списком обновлений, ответ getUpdates или JSONL
+    text = path.read_text()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict) and 'result' in data:
+        data = data['result']
+    return data if isinstance(data, list) else [data]
+
+
+class Command(BaseCommand):
+    help = 'Отправляет записанные обновления Telegram на вебхук, чтобы проверить его локально'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', type=Path)
+        parser.add_argument('--url', default='http://127.0.0.1:8000/tg/webhook')
+        parser.add_argument('--repeat', type=int, default=1, help='Сколько раз отправить каждое обновление')
+
+    def handle(self, *args, **options):
+        updates = [update for path in options['files'] for update in read_updates(path)]
+        if not updates:
+            raise CommandError('Обновлений не найдено')
+        headers = {}
+        if settings.BOT_WEBHOOK_SECRET:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = settings.BOT_WEBHOOK_SECRET
+
+        statuses = {}
+        started_at = time.perf_counter()
+        with requests.Session() as session:
+            for _ in range(options['repeat']):
+                for update in updates:
+                    response = session.post(options['url'], json=update, headers=headers)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started_at
+
+        sent = sum(statuses.values())
+        self.stdout.write(f'Отправлено {sent} обновлений за {elapsed:.2f} сек., ответы: {statuses}')
@@ -1,23 +1,99 @@
+import signal
+import threading
+
 from django.conf import settings
-from django.core.management import BaseCommand
-from telegram.ext import (
-    Updater,
-    CallbackQueryHandler,
-    MessageHandler,
-    CommandHandler,
-    Filters
-)
+from django.core.management import BaseCommand, CommandError
+from telegram import Bot, Update
+from telegram.ext import Updater, TypeHandler
 
-from tg.bot import state_machine
+from tg.bot.runtime import setup_dispatcher, DispatcherRuntime
+from tg.bot.shards import ShardRouter
+from tg.bot.webhook import WEBHOOK_PROCESSES
+from wb.wb_api import WBApiClient
+from wb.wb_api.metrics import registry
 
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--webhook',
+            action='store_true',
+            help='Зарегистрировать вебхук BOT_WEBHOOK_URL и выйти. Обновления будет принимать веб-приложение'
+        )
+        parser.add_argument(
+            '--jobs',
+            action='store_true',
+            help='Только фоновые задачи без приема обновлений, для работы через вебхук'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=settings.BOT_SHARDS,
+            help='Сколько процессов обрабатывают обновления, чаты распределяются по ним по chat_id'
+        )
+
     def handle(self, *args, **options):
+        if options['webhook']:
+            self.set_webhook()
+            return
+        if options['jobs']:
+            self.run_jobs()
+            return
+        if options['shards'] > 1:
+            self.run_shards(options['shards'])
+            return
+
+        if settings.WB_API_PREWARM_CONNECTIONS:
+            WBApiClient().warm_up(settings.WB_API_PREWARM_CONNECTIONS)
+
         updater = Updater(settings.TG_TOKEN)
-        dispatcher = updater.dispatcher
-        dispatcher.add_handler(CallbackQueryHandler(state_machine.process))
-        dispatcher.add_handler(MessageHandler(Filters.text, state_machine.process))
-        dispatcher.add_handler(CommandHandler('start', state_machine.process))
+        executor = setup_dispatcher(updater.dispatcher)
+        # Опрос сам снимает вебхук, если он был зарегистрирован
         updater.start_polling()
         updater.idle()
+        executor.shutdown()
+        if settings.WB_METRICS_DUMP_FILE:
+            registry.dump(settings.WB_METRICS_DUMP_FILE)
+
+    @staticmethod
+    def run_shards(shards: int):
+        router = ShardRouter(shards)
+        router.start()
+        updater = Updater(settings.TG_TOKEN)
+        updater.dispatcher.add_handler(TypeHandler(Update, router.route))
+        updater.start_polling()
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        # Упавшие шарды перезапускает главный поток, а не поток диспетчера
+        while not stop.wait(1):
+            router.restart_dead_shards()
+        updater.stop()
+        router.stop()
+
+    @staticmethod
+    def run_jobs():
+        # Веб-процессы вебхука фоновых задач не запускают, иначе синхронизация шла бы в каждом из них
+        WBApiClient().split_between_processes(WEBHOOK_PROCESSES)
+        runtime = DispatcherRuntime(settings.BOT_UPDATE_QUEUE_SIZE)
+        runtime.start()
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        stop.wait()
+        runtime.stop()
+        if settings.WB_METRICS_DUMP_FILE:
+            registry.dump(settings.WB_METRICS_DUMP_FILE)
+
+    def set_webhook(self):
+        if not settings.BOT_WEBHOOK_URL:
+            raise CommandError('Не задан BOT_WEBHOOK_URL')
+        if not settings.BOT_WEBHOOK_SECRET:
+            raise CommandError('Не задан BOT_WEBHOOK_SECRET')
+        Bot(settings.TG_TOKEN).set_webhook(
+            settings.BOT_WEBHOOK_URL,
+            secret_token=settings.BOT_WEBHOOK_SECRET,
+            max_connections=settings.BOT_WORKERS
+        )
+        self.stdout.write(f'Вебхук зарегистрирован: {settings.BOT_WEBHOOK_URL}')
@@ -0,0 +1,11 @@
+import multiprocessing
+
+import django
+
+
+def run(index: int, shards: int, updates: multiprocessing.Queue):
+    # Процесс шарда запускается через spawn и начинает с чистого интерпретатора: tg.bot при импорте
+    # загружает модели, поэтому сначала настраиваем Django, а уже потом импортируем шард
+    django.setup()
+    from tg.bot.shards import run_shard
+    run_shard(index, shards, updates)
@@ -1,3 +1,187 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from tg.bot import state_machine
+from tg.bot.executor import ChatSerializedExecutor
+from tg.bot.sessions import MemorySessionStore, SQLiteSessionStore, load_locator
+from tg.bot.state_classes import page_snapshots
+from tg.bot.state_machine import Locator
+from wb.wb_api.types import Order
+
+
+def make_order(order_id: int, article: str) -> Order:
+    return Order(
+        id=order_id,
+        article=article,
+        convertedPrice=100,
+        createdAt=datetime.fromtimestamp(order_id, tz=timezone.utc)
+    )
+
+
+def make_state(state_name: str, query: str):
+    state = state_machine.create_state(state_name)
+    state.update = SimpleNamespace(
+        callback_query=SimpleNamespace(id='0', data=query),
+        effective_chat=SimpleNamespace(id=1),
+        effective_message=SimpleNamespace(message_id=1)
+    )
+    state.context = mock.Mock()
+    return state
+
+
+class ChatSerializedExecutorTests(SimpleTestCase):
+
+    def test_updates_of_one_chat_run_in_order(self):
+        executor = ChatSerializedExecutor(max_workers=8)
+        handled = {chat_id: [] for chat_id in range(5)}
+        running = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def handler(update, context):
+            chat_id, number = update
+            with lock:
+                if chat_id in running:
+                    overlaps.append(update)
+                running.add(chat_id)
+            time.sleep(random.random() / 1000)
+            with lock:
+                running.discard(chat_id)
+                handled[chat_id].append(number)
+
+        for number in range(50):
+            for chat_id in handled:
+                executor.submit(chat_id, handler, (chat_id, number), None)
+        executor.shutdown()
+
+        self.assertEqual(overlaps, [])
+        for numbers in handled.values():
+            self.assertEqual(numbers, list(range(50)))
+
+    def test_error_does_not_stop_chat_queue(self):
+        errors = []
+        executor = ChatSerializedExecutor(max_workers=2, on_error=lambda update, ex: errors.append(update))
+        handled = []
+
+        def handler(update, context):
+            if update == 1:
+                raise ValueError
+            handled.append(update)
+
+        for update in range(3):
+            executor.submit('chat', handler, update, None)
+        executor.shutdown()
+
+        self.assertEqual(errors, [1])
+        self.assertEqual(handled, [0, 2])
+
+
+class BulkAddOrdersStateTests(SimpleTestCase):
+    shown_orders = [make_order(1, 'a'), make_order(2, 'b'), make_order(3, 'b')]
+
+    def click(self, query: str, current_orders: list[Order]):
+        with mock.patch('tg.bot.states.wb_client.get_new_orders', return_value=self.shown_orders):
+            state = make_state('BULK_ADD_ORDERS', query)
+            state.state_data = {'supply_id': 'WB-GI-1', 'orders_key': state.get_state_data()['orders_key']}
+        with mock.patch('tg.bot.states.wb_client.get_new_orders', return_value=current_orders):
+            locator = state.react_on_inline_keyboard()
+        return state, locator
+
+    def test_article_click_adds_rendered_orders(self):
+        state, locator = self.click('article#1', self.shown_orders)
+        self.assertEqual(locator.state_name, 'SUPPLY')
+        job_context = state.context.job_queue.run_once.call_args.kwargs['context']
+        self.assertEqual(job_context['order_ids'], [2, 3])
+
+    def test_click_on_changed_list_is_rejected(self):
+        # Новый заказ с артикулом раньше по алфавиту сдвинул бы индексы кнопок
+        for query in ('article#1', 'all'):
+            state, locator = self.click(query, [make_order(0, '0')] + self.shown_orders)
+            self.assertEqual(locator.state_name, 'BULK_ADD_ORDERS')
+            state.context.job_queue.run_once.assert_not_called()
+
+
+class OrderDetailsStateTests(SimpleTestCase):
+
+    def test_order_no_longer_new_returns_to_list(self):
+        state = make_state('ORDER_DETAILS', '2')
+        with mock.patch('tg.bot.states.wb_client.get_new_orders', return_value=[make_order(1, 'a')]):
+            locator = state.enter_state(state.update, state.context, order_id=2)
+        self.assertEqual(locator.state_name, 'NEW_ORDERS')
+        state.context.bot.answer_callback_query.assert_called_once()
+        self.assertIn('1 шт.', state.context.bot.edit_message_text.call_args.kwargs['text'])
+
+
+class SessionTests(SimpleTestCase):
+
+    def test_compact_keeps_stored_params_only(self):
+        locator = Locator('BULK_ADD_ORDERS', {
+            'supply_id': 'WB-GI-1',
+            'page_number': 2,
+            'new_orders': [make_order(1, 'a')],
+            'articles': [('a', 1)]
+        })
+        self.assertEqual(
+            state_machine.compact(locator),
+            Locator('BULK_ADD_ORDERS', {'supply_id': 'WB-GI-1', 'page_number': 2})
+        )
+
+    def test_store_round_trip(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for store in (MemorySessionStore(), SQLiteSessionStore(os.path.join(directory.name, 'sessions.sqlite3'))):
+            with self.subTest(store=type(store).__name__):
+                locator = state_machine.compact(Locator('EDIT_SUPPLY', {'supply_id': 'WB-GI-1', 'page_number': 3}))
+                store.set(1, locator)
+                store.set(2, Locator('MAIN_MENU'))
+                self.assertEqual(store.get(1), locator)
+                self.assertIsNone(store.get(3))
+
+                store.delete(2)
+                self.assertIsNone(store.get(2))
+                self.assertEqual(store.evict_idle(60), 0)
+                self.assertEqual(store.evict_idle(-1), 1)
+                self.assertIsNone(store.get(1))
+
+    def test_broken_record_is_missing(self):
+        self.assertIsNone(load_locator(b'not json'))
+
+
+class PageSnapshotTests(SimpleTestCase):
+
+    def setUp(self):
+        page_snapshots.clear()
+        self.addCleanup(page_snapshots.clear)
+        patcher = mock.patch('tg.bot.states.supply_mirror.get_supplies', return_value=[])
+        self.get_supplies = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, chat_id: int = 1, **params):
+        state = make_state('SUPPLIES', '')
+        state.update.effective_chat.id = chat_id
+        state.load_state_data(params)
+
+    def test_page_flip_uses_snapshot(self):
+        self.load(only_active=True)
+        self.load(only_active=True, page_number=2)
+        self.load(only_active=True, page_number=1)
+        self.assertEqual(self.get_supplies.call_count, 1)
+
+    def test_entering_screen_reloads(self):
+        self.load(only_active=True, page_number=2)
+        self.load(only_active=True)
+        self.assertEqual(self.get_supplies.call_count, 2)
+
+    def test_key_includes_chat_and_screen_params(self):
+        self.load(only_active=True)
+        self.load(only_active=False, page_number=2)
+        self.load(chat_id=2, only_active=True, page_number=2)
+        self.assertEqual(self.get_supplies.call_count, 3)
@@ -1,3 +1,29 @@
-from django.shortcuts import render
+import hmac
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseBadRequest, Http404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from tg.bot.webhook import put_update
+
+
+@csrf_exempt
+@require_POST
+def webhook(request):
+    if not settings.BOT_WEBHOOK_URL:
+        raise Http404
+    # Без секрета принять обновление от кого угодно нельзя, поэтому он обязателен
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not settings.BOT_WEBHOOK_SECRET or not hmac.compare_digest(secret, settings.BOT_WEBHOOK_SECRET):
+        return HttpResponseForbidden()
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+        return HttpResponseBadRequest()
+    if not put_update(data):
+        return HttpResponse(status=503, headers={'Retry-After': '1'})
+    return HttpResponse()
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from wb.models import Product, SyncCheckpoint
+from wb.wb_api import WBApiClient, types
+from wb.sync import one_at_a_time
+
+CATALOG_CHECKPOINT_NAME = 'product_cards'
+
+
+def save_product_cards(product_cards: list[dict]):
+    products = []
+    for product_card in product_cards:
+        product = types.Product.parse_from_card(product_card)
+        products.append(Product(
+            nm_id=product_card['nmID'],
+            article=product.article,
+            name=product.name[:128],
+            barcode=product.barcode,
+            brand=product.brand[:64],
+            colors=list(product.colors),
+            countries=list(product.countries),
+            updated_at=product_card.get('updatedAt')
+        ))
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=['nm_id'],
+        update_fields=['article', 'name', 'barcode', 'brand', 'colors', 'countries', 'updated_at']
+    )
+
+
+@one_at_a_time
+def sync_catalog(max_age: int | None = None) -> bool:
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=CATALOG_CHECKPOINT_NAME)
+    if max_age is not None and checkpoint.synced_at \
+            and timezone.now() - checkpoint.synced_at < timedelta(seconds=max_age):
+        return False
+
+    wb_client = WBApiClient()
+    limit = 100
+    while True:
+        # Карточки идут по возрастанию даты изменения, поэтому с сохраненного курсора
+        # приходят только карточки, измененные после прошлой синхронизации
+        product_cards, response_cursor = wb_client.get_product_cards(
+            checkpoint.cursor,
+            limit,
+            ascending=True
+        )
+        with transaction.atomic():
+            if product_cards:
+                save_product_cards(product_cards)
+                checkpoint.cursor = {
+                    'updatedAt': response_cursor['updatedAt'],
+                    'nmID': response_cursor['nmID']
+                }
+            checkpoint.synced_at = timezone.now()
+            checkpoint.save()
+        if response_cursor['total'] < limit:
+            return True
+
+
+def get_products(articles: set[str]) -> list[types.Product]:
+    synced = sync_catalog(max_age=settings.WB_CATALOG_SYNC_INTERVAL)
+    products = {
+        product.article: product.as_wb_product()
+        for product in Product.objects.filter(article__in=articles)
+    }
+    if not synced and articles - products.keys():
+        sync_catalog()
+        products.update({
+            product.article: product.as_wb_product()
+            for product in Product.objects.filter(article__in=articles - products.keys())
+        })
+    return list(products.values())
@@ -0,0 +1,62 @@
+from django.core.management import BaseCommand
+
+from wb.stand_in import SyntheticAccount, WBStandInServer, Faults, ReplayStore
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку API Wildberries с синтетическим кабинетом продавца'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--supplies', type=int, default=1000, help='Сколько поставок сгенерировать')
+        parser.add_argument('--open-supplies', type=int, default=5, help='Сколько из них оставить открытыми')
+        parser.add_argument('--orders', type=int, default=100_000, help='Сколько заказов в истории')
+        parser.add_argument('--new-orders', type=int, default=100, help='Сколько новых заказов')
+        parser.add_argument('--articles', type=int, default=1000, help='Сколько карточек товаров')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--latency', type=float, default=0., help='Задержка ответа, секунды')
+        parser.add_argument('--jitter', type=float, default=0., help='Разброс задержки, секунды')
+        parser.add_argument('--error-rate', type=float, default=0., help='Доля ответов 500/504')
+        parser.add_argument(
+            '--rate-limit',
+            action='append',
+            default=[],
+            metavar='GROUP=RPM',
+            help='Лимит запросов в минуту для группы методов, например orders=300. Можно указать несколько раз'
+        )
+        parser.add_argument('--replay-dir', help='Каталог с записанными ответами WB (WB_API_RECORD_DIR)')
+
+    def handle(self, *args, **options):
+        rate_limits = {}
+        for rate_limit in options['rate_limit']:
+            group, requests_per_minute = rate_limit.split('=')
+            rate_limits[group] = float(requests_per_minute)
+
+        account = SyntheticAccount(
+            supplies=options['supplies'],
+            orders=options['orders'],
+            new_orders=options['new_orders'],
+            articles=options['articles'],
+            open_supplies=options['open_supplies'],
+            seed=options['seed']
+        )
+        faults = Faults(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            rate_limits=rate_limits
+        )
+        replay_store = ReplayStore(options['replay_dir']) if options['replay_dir'] else None
+
+        server = WBStandInServer((options['host'], options['port']), account, faults, replay_store)
+        self.stdout.write(f'Заглушка WB слушает {server.base_url}')
+        if replay_store is not None:
+            self.stdout.write(f'Записанных ответов: {len(replay_store)}')
+        self.stdout.write(f'Запустите бота с WB_API_BASE_URL={server.base_url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from wb.catalog import sync_catalog
+from wb.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Синхронизирует локальный каталог карточек товаров с Wildberries'
+
+    def handle(self, *args, **options):
+        sync_catalog()
+        self.stdout.write(f'Товаров в каталоге: {Product.objects.count()}')
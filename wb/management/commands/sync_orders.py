@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from wb.models import Order
+from wb.orders import sync_orders
+
+
+class Command(BaseCommand):
+    help = 'Загружает историю заказов Wildberries в локальную базу, продолжая с сохраненного курсора'
+
+    def handle(self, *args, **options):
+        sync_orders()
+        self.stdout.write(f'Заказов в базе: {Order.objects.filter(wb_id__isnull=False).count()}')
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.3 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wb', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='Название')),
+                ('cursor', models.JSONField(blank=True, default=dict, verbose_name='Курсор')),
+                ('synced_at', models.DateTimeField(blank=True, null=True, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Точка синхронизации',
+                'verbose_name_plural': 'Точки синхронизации',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='colors',
+            field=models.JSONField(blank=True, default=list, verbose_name='Цвета'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='countries',
+            field=models.JSONField(blank=True, default=list, verbose_name='Страны производства'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='nm_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, verbose_name='Артикул WB'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Обновлена в WB'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='article',
+            field=models.CharField(db_index=True, max_length=64, verbose_name='Артикул'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(db_index=True, max_length=32, verbose_name='Штрихкод'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='brand',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Бренд'),
+        ),
+    ]
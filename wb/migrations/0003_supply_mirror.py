@@ -0,0 +1,22 @@
+# Generated by Django 4.2.3 on 2026-10-18 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wb', '0002_product_catalog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='supply',
+            name='name',
+            field=models.CharField(max_length=128, verbose_name='Название'),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(fields=['is_open', '-created_at'], name='wb_supply_is_open_15adba_idx'),
+        ),
+    ]
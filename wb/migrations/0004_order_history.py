@@ -0,0 +1,58 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wb', '0003_supply_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='article',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Артикул'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='wb_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, verbose_name='Номер заказа WB'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, verbose_name='Дата и время закрытия'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='wb.product'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='qr_code',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='qr_code_number',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=11, null=True, verbose_name='номер QR-кода'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(blank=True, max_length=32, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='supply',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='wb.supply', verbose_name='Поставка'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supply', '-created_at'], name='wb_order_supply__e86b91_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wb', '0004_order_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supply',
+            name='orders_synced',
+            field=models.BooleanField(default=False, verbose_name='Заказы в истории'),
+        ),
+    ]
@@ -1,45 +1,93 @@
 from django.db import models
 from django.utils.datetime_safe import datetime
 
+from wb.wb_api import types
+
 
 class Supply(models.Model):
     id = models.CharField(max_length=32, primary_key=True)
-    name = models.CharField('Название', max_length=32)
+    name = models.CharField('Название', max_length=128)
     closed_at = models.DateTimeField('Закрыта', null=True, blank=True)
     created_at = models.DateTimeField('Создана')
     is_open = models.BooleanField('Открыта', default=False)
     qr_code = models.TextField(null=True, blank=True)
+    # Состав перечитан в историю заказов уже после закрытия, поэтому локальным заказам поставки можно доверять
+    orders_synced = models.BooleanField('Заказы в истории', default=False)
 
     class Meta:
         verbose_name = 'Поставка'
         verbose_name_plural = 'Поставки'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_open', '-created_at']),
+        ]
 
     def __str__(self):
-        is_done = ('Открыта', 'Закрыта')
-        return f'{self.name} | {self.id} | {is_done[self.is_open]}'
+        is_open = ('Закрыта', 'Открыта')
+        return f'{self.name} | {self.id} | {is_open[self.is_open]}'
+
+    def as_wb_supply(self) -> types.Supply:
+        return types.Supply(
+            id=self.id,
+            name=self.name,
+            closedAt=self.closed_at,
+            createdAt=self.created_at,
+            done=not self.is_open
+        )
 
 
 class Product(models.Model):
-    article = models.CharField('Артикул', max_length=64)
+    nm_id = models.BigIntegerField('Артикул WB', unique=True, null=True, blank=True)
+    article = models.CharField('Артикул', max_length=64, db_index=True)
     name = models.CharField('Название', max_length=128)
-    barcode = models.CharField('Штрихкод', max_length=32)
-    brand = models.CharField('Бренд', max_length=32)
+    barcode = models.CharField('Штрихкод', max_length=32, db_index=True)
+    brand = models.CharField('Бренд', max_length=64, blank=True)
+    colors = models.JSONField('Цвета', default=list, blank=True)
+    countries = models.JSONField('Страны производства', default=list, blank=True)
+    updated_at = models.DateTimeField('Обновлена в WB', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['article']
 
+    def __str__(self):
+        return f'{self.article} | {self.name}'
+
+    def as_wb_product(self) -> types.Product:
+        return types.Product(
+            article=self.article,
+            name=self.name,
+            barcode=self.barcode,
+            brand=self.brand,
+            colors=self.colors,
+            countries=self.countries
+        )
+
+
+class SyncCheckpoint(models.Model):
+    name = models.CharField('Название', max_length=32, primary_key=True)
+    cursor = models.JSONField('Курсор', default=dict, blank=True)
+    synced_at = models.DateTimeField('Синхронизировано', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Точка синхронизации'
+        verbose_name_plural = 'Точки синхронизации'
+
+    def __str__(self):
+        return self.name
+
 
 class Order(models.Model):
-    supply = models.ForeignKey(Supply, on_delete=models.PROTECT, verbose_name='Поставка', null=True, blank=True)
+    wb_id = models.BigIntegerField('Номер заказа WB', unique=True, null=True, blank=True)
+    supply = models.ForeignKey(Supply, on_delete=models.SET_NULL, verbose_name='Поставка', null=True, blank=True)
+    article = models.CharField('Артикул', max_length=64, db_index=True, blank=True)
     price = models.DecimalField('Сумма', max_digits=10, decimal_places=2)
-    product = models.ForeignKey(Product, on_delete=models.PROTECT)
-    created_at = models.DateTimeField('Дата и время закрытия')
-    status = models.CharField('Статус', max_length=32)
-    qr_code = models.TextField()
-    qr_code_number = models.DecimalField('номер QR-кода', max_digits=11, decimal_places=4)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, null=True, blank=True)
+    created_at = models.DateTimeField('Дата и время закрытия', db_index=True)
+    status = models.CharField('Статус', max_length=32, blank=True)
+    qr_code = models.TextField(blank=True)
+    qr_code_number = models.DecimalField('номер QR-кода', max_digits=11, decimal_places=4, null=True, blank=True)
 
     @property
     def created_ago(self):
@@ -49,9 +97,21 @@ class Order(models.Model):
         return f'{hours:02.0f}ч. {minutes:02.0f}м.'
 
     def __str__(self):
-        return f'{self.product.article} | {self.created_ago}'
+        return f'{self.article} | {self.created_ago}'
+
+    def as_wb_order(self) -> types.Order:
+        return types.Order(
+            id=self.wb_id,
+            supplyId=self.supply_id or '',
+            convertedPrice=int(self.price * 100),
+            article=self.article,
+            createdAt=self.created_at
+        )
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['supply', '-created_at']),
+        ]
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from wb import catalog, supplies as supply_mirror
+from wb.models import Order, Product, Supply, SyncCheckpoint
+from wb.wb_api import WBApiClient, types
+from wb.wb_api.batching import fan_out
+from wb.wb_api.helpers import SupplyFilter
+from wb.sync import one_at_a_time
+
+ORDERS_CHECKPOINT_NAME = 'orders'
+
+
+def _refresh_missing_supplies(supply_ids: set[str]) -> set[str]:
+    # Поставку, которой еще нет в зеркале, подтягиваем отдельно, иначе заказ останется без нее.
+    # Это запросы к WB, поэтому они идут до транзакции и не держат блокировку базы
+    known_supply_ids = set(Supply.objects.filter(id__in=supply_ids).values_list('id', flat=True))
+    for supply_id in supply_ids - known_supply_ids:
+        if supply_mirror.refresh_supply(supply_id):
+            known_supply_ids.add(supply_id)
+    return known_supply_ids
+
+
+def save_orders(orders: types.OrderBatch, checkpoint: SyncCheckpoint | None = None):
+    # Заказы читаются прямо из колонок пачки, без создания объектов types.Order.
+    # Если передан checkpoint, он сохраняется в одной транзакции с заказами
+    known_supply_ids = _refresh_missing_supplies(set(orders.supply_ids) - {''})
+    product_ids = dict(Product.objects.filter(article__in=set(orders.articles)).values_list('article', 'id'))
+
+    with transaction.atomic():
+        Order.objects.bulk_create(
+            [
+                Order(
+                    wb_id=order_id,
+                    supply_id=supply_id if supply_id in known_supply_ids else None,
+                    article=article[:64],
+                    price=Decimal(converted_price) / 100,
+                    product_id=product_ids.get(article),
+                    created_at=datetime.fromtimestamp(created_at, tz=dt_timezone.utc)
+                )
+                for order_id, supply_id, article, converted_price, created_at in zip(
+                    orders.ids,
+                    orders.supply_ids,
+                    orders.articles,
+                    orders.converted_prices,
+                    orders.created_at
+                )
+            ],
+            update_conflicts=True,
+            unique_fields=['wb_id'],
+            update_fields=['supply', 'article', 'price', 'product', 'created_at']
+        )
+        if checkpoint is not None:
+            checkpoint.save()
+
+
+def _refresh_supply_orders(closed_since: datetime):
+    # Сборочные задания добавляются только в открытые поставки, а история заказов
+    # старые заказы заново не отдает. Поэтому состав открытых поставок перечитываем отдельно,
+    # а закрытых - еще раз после закрытия, чтобы не потерять заказы, добавленные перед самым закрытием
+    wb_client = WBApiClient()
+    open_supply_ids = [supply.id for supply in supply_mirror.get_supplies(SupplyFilter.ACTIVE)]
+    closed_supply_ids = list(
+        Supply.objects.filter(is_open=False, orders_synced=False, closed_at__gte=closed_since)
+        .values_list('id', flat=True)
+    )
+    supply_orders = fan_out(
+        lambda chunk: [wb_client.get_supply_orders(supply_id) for supply_id in chunk],
+        open_supply_ids + closed_supply_ids,
+        1,
+        settings.WB_API_MAX_PARALLEL_CHUNKS
+    )
+    save_orders(types.OrderBatch.from_orders(order for orders in supply_orders for order in orders))
+    Supply.objects.filter(id__in=closed_supply_ids).update(orders_synced=True)
+
+
+@one_at_a_time
+def sync_orders(max_age: int | None = None) -> bool:
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=ORDERS_CHECKPOINT_NAME)
+    if max_age is not None and checkpoint.synced_at \
+            and timezone.now() - checkpoint.synced_at < timedelta(seconds=max_age):
+        return False
+
+    # Заказы ссылаются на карточки и поставки, поэтому сначала обновляем их зеркала
+    catalog.sync_catalog(max_age=settings.WB_CATALOG_SYNC_INTERVAL)
+    supply_mirror.sync_supplies(max_age=settings.WB_SUPPLIES_SYNC_INTERVAL)
+
+    wb_client = WBApiClient()
+    limit = 1000
+    date_from = checkpoint.cursor.get('dateFrom') or int(
+        (timezone.now() - timedelta(days=settings.WB_ORDERS_SYNC_DAYS)).timestamp()
+    )
+    next_cursor = checkpoint.cursor.get('next', 0)
+    while True:
+        # Как и с поставками, курсор двигаем только за полные страницы, чтобы неполная перечитывалась
+        order_batch, response_next = wb_client.get_orders_batch(next_cursor, limit, date_from, stream=True)
+        if len(order_batch) < limit:
+            save_orders(order_batch)
+            break
+        checkpoint.cursor = {'dateFrom': date_from, 'next': response_next}
+        save_orders(order_batch, checkpoint)
+        next_cursor = response_next
+
+    _refresh_supply_orders(closed_since=datetime.fromtimestamp(date_from, tz=dt_timezone.utc))
+
+    if not checkpoint.cursor:
+        checkpoint.cursor = {'dateFrom': date_from, 'next': next_cursor}
+    checkpoint.synced_at = timezone.now()
+    checkpoint.save()
+    return True
+
+
+def get_synced_supply_ids(supply_ids: list[str]) -> set[str]:
+    # Закрытые поставки, состав которых уже перечитан в историю, остальные надо спрашивать у WB
+    return set(Supply.objects.filter(id__in=supply_ids, orders_synced=True).values_list('id', flat=True))
+
+
+def get_orders(
+        supply_ids: list[str] | None = None,
+        article: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None
+) -> list[types.Order]:
+    # Читает только локальную историю, которую в фоне обновляет sync_orders_job,
+    # поэтому заказов старше WB_ORDERS_SYNC_DAYS и самых свежих здесь может не быть
+    queryset = Order.objects.filter(wb_id__isnull=False)
+    if supply_ids is not None:
+        queryset = queryset.filter(supply_id__in=supply_ids)
+    if article:
+        queryset = queryset.filter(article=article)
+    if created_from:
+        queryset = queryset.filter(created_at__gte=created_from)
+    if created_to:
+        queryset = queryset.filter(created_at__lt=created_to)
+    return [order.as_wb_order() for order in queryset]
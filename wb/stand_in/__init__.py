@@ -0,0 +1,3 @@
+from .account import SyntheticAccount
+from .recording import ResponseRecorder, ReplayStore
+from .server import WBStandInServer, Faults
@@ -0,0 +1,248 @@
+import random
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+# Прозрачная картинка 1x1, вместо настоящих стикеров и QR-кодов
+PNG_STUB = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+COLORS = ('черный', 'белый', 'красный', 'синий', 'зеленый')
+COUNTRIES = ('Россия', 'Китай', 'Турция', 'Узбекистан')
+SUPPLIER_STATUSES = ('new', 'confirm', 'complete', 'cancel')
+WB_STATUSES = ('waiting', 'sorted', 'sold', 'canceled')
+FIRST_ORDER_ID = 100_000_000
+FIRST_SUPPLY_ID = 10_000_000
+FIRST_NM_ID = 50_000_000
+
+
+def format_datetime(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class WBStandInError(Exception):
+    def __init__(self, status: int, message: str, code: str = ''):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.code = code or str(status)
+
+
+class SyntheticAccount:
+    # Искусственный кабинет продавца: поставки, сборочные задания и карточки товаров.
+    # Данные генерируются из seed, поэтому два запуска с одинаковыми параметрами отдают одно и то же
+
+    def __init__(
+            self,
+            supplies: int = 100,
+            orders: int = 1000,
+            new_orders: int = 50,
+            articles: int = 100,
+            open_supplies: int = 5,
+            seed: int = 0
+    ):
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        started_at = now - timedelta(days=365)
+
+        self.cards = self._generate_cards(articles, started_at)
+        article_names = [card['vendorCode'] for card in self.cards]
+
+        self.supplies: dict[str, dict] = {}
+        self.supply_orders: dict[str, list[int]] = {}
+        supply_step = (now - started_at) / max(supplies, 1)
+        for index in range(supplies):
+            created_at = started_at + supply_step * index
+            is_done = index < supplies - open_supplies
+            self._add_supply(
+                f'WB-GI-{FIRST_SUPPLY_ID + index}',
+                f'Поставка {index + 1}',
+                created_at,
+                created_at + supply_step / 2 if is_done else None
+            )
+
+        # Заказы отсортированы по id и дате создания, чтобы курсоры и фильтры по датам работали бисекцией
+        self.orders: dict[int, dict] = {}
+        self.order_ids: list[int] = []
+        self.order_timestamps: list[float] = []
+        supply_ids = list(self.supplies)
+        order_step = (now - started_at) / max(orders + new_orders, 1)
+        for index in range(orders + new_orders):
+            is_new = index >= orders
+            supply_id = '' if is_new or not supply_ids else self._random.choice(supply_ids)
+            self._add_order(
+                FIRST_ORDER_ID + index,
+                self._random.choice(article_names) if article_names else 'article',
+                started_at + order_step * index,
+                supply_id
+            )
+        self.new_order_ids = set(self.order_ids[orders:])
+
+    def _generate_cards(self, articles: int, started_at: datetime) -> list[dict]:
+        cards = []
+        for index in range(articles):
+            cards.append({
+                'nmID': FIRST_NM_ID + index,
+                'vendorCode': f'ART-{index + 1:05d}',
+                'title': f'Товар {index + 1}',
+                'brand': 'Stand-in',
+                'characteristics': [
+                    {'name': 'Цвет', 'value': [self._random.choice(COLORS)]},
+                    {'name': 'Страна производства', 'value': [self._random.choice(COUNTRIES)]},
+                ],
+                'sizes': [{'skus': [f'{2000000000000 + index}']}],
+                'mediaFiles': [],
+                'updatedAt': format_datetime(started_at + timedelta(minutes=index)),
+            })
+        return cards
+
+    def _add_supply(self, supply_id: str, name: str, created_at: datetime, closed_at: datetime | None):
+        self.supplies[supply_id] = {
+            'id': supply_id,
+            'name': name,
+            'createdAt': format_datetime(created_at),
+            'closedAt': format_datetime(closed_at) if closed_at else None,
+            'done': closed_at is not None,
+        }
+        self.supply_orders[supply_id] = []
+
+    def _add_order(self, order_id: int, article: str, created_at: datetime, supply_id: str):
+        self.orders[order_id] = {
+            'id': order_id,
+            'supplyId': supply_id,
+            'convertedPrice': self._random.randint(100, 10000) * 100,
+            'article': article,
+            'createdAt': format_datetime(created_at),
+        }
+        self.order_ids.append(order_id)
+        self.order_timestamps.append(created_at.timestamp())
+        if supply_id:
+            self.supply_orders[supply_id].append(order_id)
+
+    def _get_supply(self, supply_id: str) -> dict:
+        if supply_id not in self.supplies:
+            raise WBStandInError(404, 'Поставка не найдена', 'NotFound')
+        return self.supplies[supply_id]
+
+    def _get_order(self, order_id: int) -> dict:
+        if order_id not in self.orders:
+            raise WBStandInError(404, 'Сборочное задание не найдено', 'NotFound')
+        return self.orders[order_id]
+
+    def list_supplies(self, limit: int, next_cursor: int) -> dict:
+        if not 1 <= limit <= 1000:
+            raise WBStandInError(400, 'Некорректный limit', 'IncorrectParameter')
+        supplies = list(self.supplies.values())[next_cursor:next_cursor + limit]
+        return {'supplies': supplies, 'next': next_cursor + len(supplies)}
+
+    def get_supply(self, supply_id: str) -> dict:
+        return self._get_supply(supply_id)
+
+    def get_supply_orders(self, supply_id: str) -> dict:
+        self._get_supply(supply_id)
+        return {'orders': [self.orders[order_id] for order_id in self.supply_orders[supply_id]]}
+
+    def get_supply_barcode(self, supply_id: str) -> dict:
+        self._get_supply(supply_id)
+        return {'barcode': supply_id, 'file': PNG_STUB}
+
+    def create_supply(self, name: str) -> dict:
+        if not name:
+            raise WBStandInError(400, 'Не указано название поставки', 'IncorrectRequestBody')
+        with self._lock:
+            supply_id = f'WB-GI-{FIRST_SUPPLY_ID + len(self.supplies)}'
+            self._add_supply(supply_id, name, datetime.now(timezone.utc), None)
+        return {'id': supply_id}
+
+    def delete_supply(self, supply_id: str):
+        with self._lock:
+            supply = self._get_supply(supply_id)
+            if supply['done'] or self.supply_orders[supply_id]:
+                raise WBStandInError(409, 'Удалить можно только пустую открытую поставку', 'FailedToDeleteSupply')
+            del self.supplies[supply_id]
+            del self.supply_orders[supply_id]
+
+    def deliver_supply(self, supply_id: str):
+        with self._lock:
+            supply = self._get_supply(supply_id)
+            if not self.supply_orders[supply_id]:
+                raise WBStandInError(409, 'Нельзя сдать пустую поставку', 'FailedToDeliverSupply')
+            supply['done'] = True
+            supply['closedAt'] = format_datetime(datetime.now(timezone.utc))
+
+    def add_order_to_supply(self, supply_id: str, order_id: int):
+        with self._lock:
+            supply = self._get_supply(supply_id)
+            order = self._get_order(order_id)
+            if supply['done']:
+                raise WBStandInError(409, 'Поставка уже закрыта', 'FailedToAddSupplyOrder')
+            if order['supplyId']:
+                self.supply_orders[order['supplyId']].remove(order_id)
+            order['supplyId'] = supply_id
+            self.supply_orders[supply_id].append(order_id)
+            self.new_order_ids.discard(order_id)
+
+    def get_new_orders(self) -> dict:
+        return {'orders': [self.orders[order_id] for order_id in sorted(self.new_order_ids)]}
+
+    def list_orders(self, limit: int, next_cursor: int, date_from: int | None, date_to: int | None) -> dict:
+        if not 1 <= limit <= 1000:
+            raise WBStandInError(400, 'Некорректный limit', 'IncorrectParameter')
+        start = bisect_right(self.order_ids, next_cursor)
+        if date_from:
+            start = max(start, bisect_right(self.order_timestamps, date_from - 1))
+        stop = bisect_right(self.order_timestamps, date_to) if date_to else len(self.order_ids)
+        order_ids = self.order_ids[start:min(stop, start + limit)]
+        return {
+            'orders': [self.orders[order_id] for order_id in order_ids],
+            'next': order_ids[-1] if order_ids else next_cursor
+        }
+
+    def get_stickers(self, order_ids: list[int]) -> dict:
+        if not 1 <= len(order_ids) <= 100:
+            raise WBStandInError(400, 'Можно запросить от 1 до 100 стикеров', 'IncorrectRequestBody')
+        return {
+            'stickers': [
+                {
+                    'orderId': order_id,
+                    'partA': str(order_id)[:-4],
+                    'partB': str(order_id)[-4:],
+                    'barcode': f'*{order_id}',
+                    'file': PNG_STUB
+                }
+                for order_id in order_ids
+                if order_id in self.orders
+            ]
+        }
+
+    def get_statuses(self, order_ids: list[int]) -> dict:
+        if not 1 <= len(order_ids) <= 1000:
+            raise WBStandInError(400, 'Можно запросить от 1 до 1000 статусов', 'IncorrectRequestBody')
+        return {
+            'orders': [
+                {
+                    'id': order_id,
+                    'supplierStatus': SUPPLIER_STATUSES[order_id % len(SUPPLIER_STATUSES)],
+                    'wbStatus': WB_STATUSES[order_id % len(WB_STATUSES)]
+                }
+                for order_id in order_ids
+                if order_id in self.orders
+            ]
+        }
+
+    def list_cards(self, limit: int, cursor: dict, ascending: bool) -> dict:
+        if not 1 <= limit <= 100:
+            raise WBStandInError(400, 'Некорректный limit', 'IncorrectParameter')
+        cards = self.cards if ascending else self.cards[::-1]
+        if cursor.get('nmID'):
+            position = (cursor.get('updatedAt', ''), cursor['nmID'])
+            if ascending:
+                cards = [card for card in cards if (card['updatedAt'], card['nmID']) > position]
+            else:
+                cards = [card for card in cards if (card['updatedAt'], card['nmID']) < position]
+        cards = cards[:limit]
+        response_cursor = {'total': len(cards)}
+        if cards:
+            response_cursor.update(updatedAt=cards[-1]['updatedAt'], nmID=cards[-1]['nmID'])
+        return {'cards': cards, 'cursor': response_cursor}
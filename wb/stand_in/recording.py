@@ -0,0 +1,79 @@
+import base64
+import hashlib
+import json
+import threading
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+from requests import Response
+
+# Заголовки, которые имеет смысл воспроизводить: от них зависит поведение клиента
+REPLAYED_HEADERS = (
+    'Content-Type',
+    'Retry-After',
+    'X-Ratelimit-Remaining',
+    'X-Ratelimit-Reset',
+    'X-Ratelimit-Retry',
+)
+
+
+def get_record_key(method: str, path: str, query: str, body: bytes | str | None) -> str:
+    query = '&'.join(f'{name}={value}' for name, value in sorted(parse_qsl(query, keep_blank_values=True)))
+    if isinstance(body, str):
+        body = body.encode()
+    try:
+        # Одинаковый JSON с разным порядком ключей считаем одним запросом
+        body = json.dumps(json.loads(body), sort_keys=True).encode()
+    except (TypeError, ValueError):
+        body = body or b''
+    request_hash = hashlib.sha1(b'\n'.join((method.upper().encode(), path.encode(), query.encode(), body)))
+    return request_hash.hexdigest()
+
+
+class ResponseRecorder:
+    # Хук для requests.Session: складывает ответы WB в каталог, откуда их потом отдает заглушка
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def __call__(self, response: Response, *args, **kwargs) -> Response:
+        # Потоковые ответы не читаем, иначе клиент получит уже пустое тело
+        if kwargs.get('stream'):
+            return response
+        request = response.request
+        url = urlparse(request.url)
+        key = get_record_key(request.method, url.path, url.query, request.body)
+        record = {
+            'method': request.method,
+            'path': url.path,
+            'query': url.query,
+            'status': response.status_code,
+            'headers': {
+                header: response.headers[header]
+                for header in REPLAYED_HEADERS
+                if header in response.headers
+            },
+            'body': base64.b64encode(response.content).decode(),
+        }
+        with self._lock:
+            (self.directory / f'{key}.json').write_text(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class ReplayStore:
+
+    def __init__(self, directory: str | Path):
+        self.records = {}
+        for path in Path(directory).glob('*.json'):
+            self.records[path.stem] = json.loads(path.read_text())
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, method: str, path: str, query: str, body: bytes | None) -> tuple[int, dict, bytes] | None:
+        record = self.records.get(get_record_key(method, path, query, body))
+        if record is None:
+            return None
+        return record['status'], record['headers'], base64.b64decode(record['body'])
@@ -0,0 +1,233 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from wb.wb_api.endpoints import get_endpoint_template
+from wb.wb_api.rate_limiter import TokenBucket, get_endpoint_group
+from .account import SyntheticAccount, WBStandInError
+from .recording import ReplayStore
+
+SUPPLY_ID = r'(?P<supply_id>WB-GI-\d+)'
+ORDER_ID = r'(?P<order_id>\d+)'
+
+# Маршруты заглушки: метод, путь и имя обработчика в WBStandInHandler
+ROUTES = (
+    ('GET', re.compile(r'^/api/v3/supplies$'), 'list_supplies'),
+    ('POST', re.compile(r'^/api/v3/supplies$'), 'create_supply'),
+    ('GET', re.compile(rf'^/api/v3/supplies/{SUPPLY_ID}$'), 'get_supply'),
+    ('DELETE', re.compile(rf'^/api/v3/supplies/{SUPPLY_ID}$'), 'delete_supply'),
+    ('GET', re.compile(rf'^/api/v3/supplies/{SUPPLY_ID}/orders$'), 'get_supply_orders'),
+    ('PATCH', re.compile(rf'^/api/v3/supplies/{SUPPLY_ID}/orders/{ORDER_ID}$'), 'add_order_to_supply'),
+    ('PATCH', re.compile(rf'^/api/v3/supplies/{SUPPLY_ID}/deliver$'), 'deliver_supply'),
+    ('GET', re.compile(rf'^/api/v3/supplies/{SUPPLY_ID}/barcode$'), 'get_supply_barcode'),
+    ('GET', re.compile(r'^/api/v3/orders/new$'), 'get_new_orders'),
+    ('GET', re.compile(r'^/api/v3/orders$'), 'list_orders'),
+    ('POST', re.compile(r'^/api/v3/orders/stickers$'), 'get_stickers'),
+    ('POST', re.compile(r'^/api/v3/orders/status$'), 'get_statuses'),
+    ('POST', re.compile(r'^/content/v2/get/cards/list$'), 'list_cards'),
+)
+
+
+@dataclass
+class Faults:
+    # Задержка ответа и ее случайный разброс, секунды
+    latency: float = 0.
+    jitter: float = 0.
+    # Доля запросов, на которые отвечаем 500 или 504
+    error_rate: float = 0.
+    # Лимиты запросов в минуту по группам методов, как в rate_limiter. Пустой словарь - без лимитов
+    rate_limits: dict[str, float] = field(default_factory=dict)
+
+
+class WBStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: tuple[str, int],
+            account: SyntheticAccount,
+            faults: Faults | None = None,
+            replay_store: ReplayStore | None = None
+    ):
+        super().__init__(address, WBStandInHandler)
+        self.account = account
+        self.faults = faults or Faults()
+        self.replay_store = replay_store
+        self.buckets = {
+            group: TokenBucket(requests_per_minute)
+            for group, requests_per_minute in self.faults.rate_limits.items()
+        }
+        self.request_counts = Counter()
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count_request(self, method: str, path: str):
+        with self._lock:
+            self.request_counts[f'{method} {get_endpoint_template(path)}'] += 1
+
+    def pop_request_counts(self) -> Counter:
+        with self._lock:
+            request_counts, self.request_counts = self.request_counts, Counter()
+        return request_counts
+
+    def get_delay(self) -> float:
+        return max(0., self.faults.latency + self._random.uniform(-self.faults.jitter, self.faults.jitter))
+
+    def get_failure_status(self) -> int | None:
+        if self._random.random() < self.faults.error_rate:
+            return self._random.choice((500, 504))
+        return None
+
+    def get_throttle_delay(self, path: str) -> float:
+        bucket = self.buckets.get(get_endpoint_group(path))
+        return bucket.try_acquire() if bucket else 0
+
+
+class WBStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными пакетами, без TCP_NODELAY каждый ответ ждет delayed ACK
+    disable_nagle_algorithm = True
+    server: WBStandInServer
+
+    def log_message(self, format, *args):  # noqa
+        pass
+
+    def do_HEAD(self):  # noqa
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):  # noqa
+        self.handle_wb_request()
+
+    def do_POST(self):  # noqa
+        self.handle_wb_request()
+
+    def do_PATCH(self):  # noqa
+        self.handle_wb_request()
+
+    def do_DELETE(self):  # noqa
+        self.handle_wb_request()
+
+    def handle_wb_request(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.count_request(self.command, url.path)
+
+        if delay := self.server.get_delay():
+            time.sleep(delay)
+        if not self.headers.get('Authorization'):
+            return self.send_error_json(WBStandInError(401, 'Не передан токен', 'Unauthorized'))
+        if retry_after := self.server.get_throttle_delay(url.path):
+            return self.send_json(
+                429,
+                {'code': 'TooManyRequests', 'message': 'Слишком много запросов'},
+                {
+                    'Retry-After': f'{retry_after:.3f}',
+                    'X-Ratelimit-Retry': f'{retry_after:.3f}',
+                    'X-Ratelimit-Remaining': '0',
+                    'X-Ratelimit-Reset': f'{retry_after:.3f}',
+                }
+            )
+        if failure_status := self.server.get_failure_status():
+            return self.send_error_json(WBStandInError(failure_status, 'Внутренняя ошибка'))
+
+        if self.server.replay_store is not None:
+            recorded = self.server.replay_store.get(self.command, url.path, url.query, body)
+            if recorded is not None:
+                return self.send_raw(*recorded)
+
+        for method, pattern, handler_name in ROUTES:
+            if method == self.command and (match := pattern.match(url.path)):
+                break
+        else:
+            return self.send_error_json(WBStandInError(404, 'Метод не найден', 'NotFound'))
+
+        try:
+            payload = json.loads(body) if body else {}
+            response_json = getattr(self, handler_name)(parse_qs(url.query), payload, **match.groupdict())
+        except WBStandInError as ex:
+            return self.send_error_json(ex)
+        except (ValueError, KeyError, TypeError):
+            return self.send_error_json(WBStandInError(400, 'Некорректный запрос', 'IncorrectRequest'))
+        if response_json is None:
+            return self.send_raw(204, {}, b'')
+        self.send_json(200, response_json)
+
+    def send_raw(self, status: int, headers: dict, body: bytes):
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def send_json(self, status: int, response_json, headers: dict | None = None):
+        body = json.dumps(response_json, ensure_ascii=False).encode()
+        self.send_raw(status, {'Content-Type': 'application/json', **(headers or {})}, body)
+
+    def send_error_json(self, error: WBStandInError):
+        self.send_json(error.status, {'code': error.code, 'message': error.message})
+
+    def list_supplies(self, query: dict, payload: dict) -> dict:
+        return self.server.account.list_supplies(int(query['limit'][0]), int(query.get('next', ['0'])[0]))
+
+    def create_supply(self, query: dict, payload: dict) -> dict:
+        return self.server.account.create_supply(payload.get('name', ''))
+
+    def get_supply(self, query: dict, payload: dict, supply_id: str) -> dict:
+        return self.server.account.get_supply(supply_id)
+
+    def delete_supply(self, query: dict, payload: dict, supply_id: str):
+        self.server.account.delete_supply(supply_id)
+
+    def get_supply_orders(self, query: dict, payload: dict, supply_id: str) -> dict:
+        return self.server.account.get_supply_orders(supply_id)
+
+    def add_order_to_supply(self, query: dict, payload: dict, supply_id: str, order_id: str):
+        self.server.account.add_order_to_supply(supply_id, int(order_id))
+
+    def deliver_supply(self, query: dict, payload: dict, supply_id: str):
+        self.server.account.deliver_supply(supply_id)
+
+    def get_supply_barcode(self, query: dict, payload: dict, supply_id: str) -> dict:
+        return self.server.account.get_supply_barcode(supply_id)
+
+    def get_new_orders(self, query: dict, payload: dict) -> dict:
+        return self.server.account.get_new_orders()
+
+    def list_orders(self, query: dict, payload: dict) -> dict:
+        date_from, date_to = query.get('dateFrom'), query.get('dateTo')
+        return self.server.account.list_orders(
+            int(query['limit'][0]),
+            int(query['next'][0]),
+            int(date_from[0]) if date_from else None,
+            int(date_to[0]) if date_to else None
+        )
+
+    def get_stickers(self, query: dict, payload: dict) -> dict:
+        return self.server.account.get_stickers(payload['orders'])
+
+    def get_statuses(self, query: dict, payload: dict) -> dict:
+        return self.server.account.get_statuses(payload['orders'])
+
+    def list_cards(self, query: dict, payload: dict) -> dict:
+        settings = payload['settings']
+        cursor = dict(settings.get('cursor', {}))
+        return self.server.account.list_cards(
+            cursor.pop('limit'),
+            cursor,
+            settings.get('sort', {}).get('ascending', False)
+        )
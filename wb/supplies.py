@@ -0,0 +1,117 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from requests import HTTPError, RequestException
+
+from wb.models import Supply, SyncCheckpoint
+from wb.wb_api import WBApiClient, types
+from wb.wb_api.batching import fan_out
+from wb.wb_api.errors import PartialBatchError, WBAPIError
+from wb.wb_api.helpers import SupplyFilter
+from wb.sync import one_at_a_time
+
+SUPPLIES_CHECKPOINT_NAME = 'supplies'
+
+logger = logging.getLogger(__name__)
+
+_FILTER_LOOKUPS = {
+    SupplyFilter.ALL: {},
+    SupplyFilter.ACTIVE: {'is_open': True},
+    SupplyFilter.CLOSED: {'is_open': False},
+}
+
+
+def save_supplies(supplies: list[types.Supply]):
+    Supply.objects.bulk_create(
+        [
+            Supply(
+                id=supply.id,
+                name=supply.name[:128],
+                closed_at=supply.closed_at,
+                created_at=supply.created_at,
+                is_open=not supply.is_done
+            )
+            for supply in supplies
+        ],
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=['name', 'closed_at', 'is_open']
+    )
+
+
+def refresh_supply(supply_id: str) -> types.Supply | None:
+    try:
+        supply = WBApiClient().get_supply(supply_id)
+    except HTTPError as ex:
+        if ex.response is None or ex.response.status_code != 404:
+            raise
+        Supply.objects.filter(id=supply_id).delete()
+        return None
+    save_supplies([supply])
+    return supply
+
+
+def _refresh_supplies(supply_ids: list[str]) -> list[types.Supply | None]:
+    # Выполняется в потоке fan_out: соединение с базой, открытое потоком, закрываем, чтобы оно не висело до сборки мусора
+    try:
+        return [refresh_supply(supply_id) for supply_id in supply_ids]
+    finally:
+        close_old_connections()
+
+
+@one_at_a_time
+def sync_supplies(max_age: int | None = None) -> bool:
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=SUPPLIES_CHECKPOINT_NAME)
+    if max_age is not None and checkpoint.synced_at \
+            and timezone.now() - checkpoint.synced_at < timedelta(seconds=max_age):
+        return False
+
+    wb_client = WBApiClient()
+    limit = 1000
+    next_cursor = checkpoint.cursor.get('next', 0)
+    fetched_ids = set()
+    while True:
+        # WB отдает поставки от старых к новым, поэтому новые всегда лежат после сохраненного курсора.
+        # Курсор двигаем только за полные страницы, чтобы последняя неполная перечитывалась
+        supplies, response_next = wb_client.get_supplies(limit, next_cursor)
+        with transaction.atomic():
+            save_supplies(supplies)
+            if len(supplies) == limit:
+                checkpoint.cursor = {'next': response_next}
+                checkpoint.save()
+        fetched_ids.update(supply.id for supply in supplies)
+        if len(supplies) < limit:
+            break
+        next_cursor = response_next
+
+    # Открытые поставки со старых страниц могли закрыться или удалиться
+    stale_open_supply_ids = list(
+        Supply.objects.filter(is_open=True).exclude(id__in=fetched_ids).values_list('id', flat=True)
+    )
+    # Неудачные поставки обновятся при следующей синхронизации, остальные уже сохранены
+    try:
+        fan_out(_refresh_supplies, stale_open_supply_ids, 1, settings.WB_API_MAX_PARALLEL_CHUNKS)
+    except PartialBatchError as ex:
+        failed_chunks = ex.failed_chunks
+    except (WBAPIError, RequestException) as ex:
+        # Не обновилась ни одна поставка, fan_out поднял исходную ошибку
+        failed_chunks = [(stale_open_supply_ids, ex)]
+    else:
+        failed_chunks = []
+    for chunk, error in failed_chunks:
+        logger.warning('Не удалось обновить поставки %s: %s', ', '.join(chunk), error)
+
+    checkpoint.synced_at = timezone.now()
+    checkpoint.save()
+    return True
+
+
+def get_supplies(supply_filter: SupplyFilter, limit: int | None = None) -> list[types.Supply]:
+    sync_supplies(max_age=settings.WB_SUPPLIES_SYNC_INTERVAL)
+    queryset = Supply.objects.filter(**_FILTER_LOOKUPS[supply_filter])
+    if limit:
+        queryset = queryset[:limit]
+    return [supply.as_wb_supply() for supply in queryset]
@@ -0,0 +1,74 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+
+from wb.wb_api.deadline import time_left
+
+try:
+    import fcntl
+except ImportError:
+    # На windows бот работает одним процессом (шардам нужен fork/spawn под linux), хватает блокировки потоков
+    fcntl = None
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _get_lock_timeout() -> float | None:
+    timeout = time_left()
+    return None if timeout is None else max(timeout, 0)
+
+
+@contextmanager
+def _process_lock(name: str, timeout: float | None = None):
+    # Отдает False, если за timeout секунд блокировку не удалось взять
+    if fcntl is None:
+        yield True
+        return
+    lock_path = Path(settings.DATABASES['default']['NAME']).with_name(f'.{name}.lock')
+    with open(lock_path, 'a') as lock_file:
+        if timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            # У flock нет таймаута, поэтому пробуем без ожидания, пока не выйдет время
+            wait_until = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= wait_until:
+                        yield False
+                        return
+                    time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def one_at_a_time(func):
+    # Синхронизацию зеркал вызывают параллельные обработчики бота, в том числе из разных процессов-шардов.
+    # Пока одна идет, остальные ждут, а затем видят свежую отметку синхронизации и выходят, не повторяя обход WB.
+    # Файл блокировки лежит рядом с базой, в которой хранятся зеркала.
+    # Ждем не дольше дедлайна обработчика: если синхронизация не освободилась, возвращаем False
+    # и вызывающий читает зеркало как есть
+    lock = threading.Lock()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        timeout = _get_lock_timeout()
+        if not lock.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        try:
+            with _process_lock(f'{func.__module__}.{func.__name__}', _get_lock_timeout()) as locked:
+                if not locked:
+                    return False
+                return func(*args, **kwargs)
+        finally:
+            lock.release()
+
+    return wrapper
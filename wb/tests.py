@@ -1,3 +1,470 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+from requests import Response
+from requests.exceptions import ConnectionError
+
+from wb.sync import one_at_a_time, _process_lock
+from wb.wb_api import WBApiClient
+from wb.wb_api.batching import iter_fan_out, fan_out, async_fan_out
+from wb.wb_api.cache import TTLCache, cached
+from wb.wb_api.circuit_breaker import CircuitBreaker
+from wb.wb_api.deadline import deadline
+from wb.wb_api.errors import CircuitOpenError, DeadlineExceeded, PartialBatchError, WBAPIError, retry_on_network_error
+from wb.wb_api.hedging import HedgeBudget
+from wb.wb_api.metrics import MetricsRegistry, Counter, get_shard_dump_path, get_web_dump_path
+from wb.wb_api.pagination import iter_cursor
+from wb.wb_api.rate_limiter import TokenBucket
+from wb.wb_api.sticker_cache import StickerCache
+from wb.wb_api.streaming import StreamedPage
+from wb.wb_api.types import OrderBatch, OrderQRCode
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_refill(self):
+        bucket = TokenBucket(60, capacity=2)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 1, places=1)
+
+        # Через секунду при 60 запросах в минуту накапливается ровно один токен
+        bucket.updated_at -= 1
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+
+    def test_refill_is_capped_by_capacity(self):
+        bucket = TokenBucket(60, capacity=2)
+        bucket.updated_at -= 60
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+
+    def test_block(self):
+        bucket = TokenBucket(60, capacity=10)
+        bucket.block(30)
+        self.assertAlmostEqual(bucket.try_acquire(), 30, places=1)
+
+        # Более короткая блокировка не сокращает уже действующую
+        bucket.block(1)
+        self.assertAlmostEqual(bucket.try_acquire(), 30, places=1)
+
+    def test_acquire_gives_up_without_waiting(self):
+        bucket = TokenBucket(60)
+        bucket.block(600)
+        started_at = time.monotonic()
+        self.assertFalse(bucket.acquire(timeout=1))
+        self.assertLess(time.monotonic() - started_at, 0.5)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_open_half_open_closed(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.opened_at -= 30
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_failed_probe_opens_again(self):
+        breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30)
+        breaker.state = CircuitBreaker.OPEN
+        breaker.opened_at = time.monotonic() - 30
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+
+class RetryDeadlineTests(SimpleTestCase):
+
+    def test_deadline_expires_during_retries(self):
+        request = mock.Mock(side_effect=ConnectionError)
+        started_at = time.monotonic()
+        with deadline(1), self.assertRaises(DeadlineExceeded):
+            retry_on_network_error(request)(url='https://example.com')
+        # Вторая пауза между попытками больше оставшегося времени, поэтому ждать ее не стали
+        self.assertEqual(request.call_count, 2)
+        self.assertLess(time.monotonic() - started_at, 1)
+
+    def test_expired_deadline_skips_request(self):
+        request = mock.Mock()
+        with deadline(0), self.assertRaises(DeadlineExceeded):
+            retry_on_network_error(request)()
+        request.assert_not_called()
+
+
+class SplitBetweenProcessesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = WBApiClient()
+        self.addCleanup(setattr, self.client, 'rate_limiter', self.client.rate_limiter)
+        self.addCleanup(setattr, self.client, 'cache_ttls', self.client.cache_ttls)
+
+    def test_quota_and_cache(self):
+        orders_rate = self.client.rate_limiter.buckets['orders'].rate
+        self.client.split_between_processes(4)
+        self.assertAlmostEqual(self.client.rate_limiter.buckets['orders'].rate, orders_rate / 4)
+        self.assertEqual(self.client.cache_ttls, {})
+
+    def test_single_process_keeps_settings(self):
+        rate_limiter, cache_ttls = self.client.rate_limiter, self.client.cache_ttls
+        self.client.split_between_processes(1)
+        self.assertIs(self.client.rate_limiter, rate_limiter)
+        self.assertIs(self.client.cache_ttls, cache_ttls)
+
+
+class HedgingTests(SimpleTestCase):
+
+    def test_budget_limits_hedged_share(self):
+        budget = HedgeBudget(ratio=0.25, max_tokens=1)
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+        for _ in range(4):
+            budget.record_request()
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+
+    def test_queue_wait_does_not_trigger_hedge(self):
+        client = WBApiClient()
+        calls = []
+
+        def send(method, url, started=None, **kwargs):
+            calls.append(url)
+            if started is not None:
+                started.set()
+            time.sleep(0.01)
+            return 'response'
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        # Единственный поток пула занят дольше p95: первая попытка ждет его в очереди
+        executor.submit(time.sleep, 0.2)
+        with mock.patch.object(client, '_send', send), \
+                mock.patch.object(client, '_hedge_executor', executor), \
+                mock.patch.object(client, '_hedge_min_delay', 0.05), \
+                mock.patch.object(client.latency_tracker, 'get_p95', return_value=0.05):
+            self.assertEqual(client._send_hedged('get', 'https://example.com/api/v3/orders/new'), 'response')
+        self.assertEqual(len(calls), 1)
+
+
+class CachedClient:
+
+    def __init__(self):
+        self.cache_ttls = {'get_supply_orders': 60}
+        self.response_cache = TTLCache()
+        self.calls = 0
+
+    @cached
+    def get_supply_orders(self, supply_id: str, limit: int = 10) -> list[dict]:
+        self.calls += 1
+        return [{'supply_id': supply_id, 'limit': limit}]
+
+
+class CachedTests(SimpleTestCase):
+
+    def test_keyword_and_positional_calls_share_key(self):
+        client = CachedClient()
+        client.get_supply_orders('WB-GI-1')
+        client.get_supply_orders(supply_id='WB-GI-1')
+        client.get_supply_orders('WB-GI-1', limit=10)
+        self.assertEqual(client.calls, 1)
+
+        client.get_supply_orders('WB-GI-1', 20)
+        self.assertEqual(client.calls, 2)
+
+    def test_invalidate_prefix(self):
+        client = CachedClient()
+        client.get_supply_orders(supply_id='WB-GI-1')
+        client.get_supply_orders(supply_id='WB-GI-2')
+
+        client.response_cache.invalidate('get_supply_orders', 'WB-GI-1')
+        client.get_supply_orders('WB-GI-2')
+        self.assertEqual(client.calls, 2)
+        client.get_supply_orders('WB-GI-1')
+        self.assertEqual(client.calls, 3)
+
+        client.response_cache.invalidate('get_supply_orders')
+        client.get_supply_orders('WB-GI-1')
+        client.get_supply_orders('WB-GI-2')
+        self.assertEqual(client.calls, 5)
+
+    def test_hit_is_a_copy(self):
+        client = CachedClient()
+        client.get_supply_orders('WB-GI-1')[0]['supply_id'] = 'changed'
+        self.assertEqual(client.get_supply_orders('WB-GI-1')[0]['supply_id'], 'WB-GI-1')
+
+    def test_expired_entries_are_purged_on_set(self):
+        cache = TTLCache()
+        cache.set(('a',), 1, -1)
+        cache.set(('b',), 2, 60)
+        self.assertEqual(list(cache._data), [('b',)])
+
+
+def double_chunk(chunk: list[int]) -> list[int]:
+    # Первые чанки отвечают дольше, чтобы результаты приходили не по порядку
+    time.sleep(0.01 * (5 - chunk[0] // 2))
+    if any(item < 0 for item in chunk):
+        raise ValueError(chunk)
+    return [item * 2 for item in chunk]
+
+
+class FanOutTests(SimpleTestCase):
+
+    def test_results_keep_order(self):
+        self.assertEqual(
+            list(iter_fan_out(double_chunk, range(10), 2)),
+            [[0, 2], [4, 6], [8, 10], [12, 14], [16, 18]]
+        )
+        self.assertEqual(fan_out(double_chunk, range(10), 3, max_workers=1), [item * 2 for item in range(10)])
+
+    def test_partial_failure(self):
+        with self.assertRaises(PartialBatchError) as context:
+            fan_out(double_chunk, [0, 1, -2, 3], 2)
+        self.assertEqual(context.exception.results, [0, 2])
+        self.assertEqual([chunk for chunk, _ in context.exception.failed_chunks], [[-2, 3]])
+
+    def test_original_error_when_nothing_succeeded(self):
+        with self.assertRaises(ValueError):
+            fan_out(double_chunk, [-1, 2], 2)
+        with self.assertRaises(ValueError):
+            fan_out(double_chunk, [-1, -2], 1)
+
+    def test_async(self):
+        async def double(chunk):
+            return double_chunk(chunk)
+
+        self.assertEqual(asyncio.run(async_fan_out(double, range(4), 2)), [0, 2, 4, 6])
+        with self.assertRaises(PartialBatchError):
+            asyncio.run(async_fan_out(double, [0, -1], 1))
+        with self.assertRaises(ValueError):
+            asyncio.run(async_fan_out(double, [-1], 1))
+
+
+class PagedSource:
+    # Три страницы по три элемента, курсор - номер страницы
+
+    def __init__(self):
+        self.fetched = []
+        self.page_fetched = [threading.Event() for _ in range(3)]
+
+    def fetch_page(self, cursor):
+        page = cursor or 0
+        self.fetched.append(page)
+        self.page_fetched[page].set()
+        return range(page * 3, page * 3 + 3), page + 1 if page < 2 else None
+
+
+class IterCursorTests(SimpleTestCase):
+
+    def test_all_pages(self):
+        source = PagedSource()
+        self.assertEqual(list(iter_cursor(source.fetch_page)), list(range(9)))
+        self.assertEqual(source.fetched, [0, 1, 2])
+
+    def test_prefetch(self):
+        source = PagedSource()
+        items = iter_cursor(source.fetch_page)
+        self.assertEqual(next(items), 0)
+        # Следующая страница загружается, пока разбирается первая
+        self.assertTrue(source.page_fetched[1].wait(1))
+        self.assertEqual(source.fetched, [0, 1])
+        items.close()
+
+    def test_without_prefetch(self):
+        source = PagedSource()
+        items = iter_cursor(source.fetch_page, prefetch=False)
+        self.assertEqual([next(items) for _ in range(3)], [0, 1, 2])
+        self.assertEqual(source.fetched, [0])
+        self.assertEqual(next(items), 3)
+        self.assertEqual(source.fetched, [0, 1])
+
+    def test_until(self):
+        source = PagedSource()
+        items = iter_cursor(source.fetch_page, prefetch=False, until=lambda item: item == 4)
+        self.assertEqual(list(items), [0, 1, 2, 3, 4])
+        self.assertEqual(source.fetched, [0, 1])
+
+
+def make_response(body: dict) -> Response:
+    response = Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(json.dumps(body).encode())
+    return response
+
+
+class StreamedPageTests(SimpleTestCase):
+
+    def test_items_and_meta(self):
+        body = {
+            'next': 42,
+            'orders': [{'id': 1, 'skus': ['a', 'b']}, {'id': 2, 'skus': []}],
+            'paging': {'total': 2}
+        }
+        page = StreamedPage(make_response(body), 'orders', lambda item: item['id'])
+        self.assertEqual(page.meta, {})
+        self.assertEqual(list(page), [1, 2])
+        self.assertEqual(page.count, 2)
+        self.assertEqual(page.meta, {'next': 42, 'paging': {'total': 2}})
+
+    def test_error_in_body(self):
+        for body in (
+                {'code': 'IncorrectParameter', 'message': 'Некорректный параметр'},
+                {'error': True, 'errorText': 'Ошибка', 'additionalErrors': None, 'orders': []}
+        ):
+            with self.subTest(body=body), self.assertRaises(WBAPIError):
+                list(StreamedPage(make_response(body), 'orders', dict))
+
+
+class OrderBatchTests(SimpleTestCase):
+
+    def test_from_json(self):
+        body = {'next': 7, 'orders': [
+            {'id': 1, 'convertedPrice': 100, 'article': 'a', 'createdAt': '2024-01-01T00:00:00Z', 'supplyId': 'WB-1'}
+        ]}
+        batch, response_next = OrderBatch.from_json(json.dumps(body))
+        self.assertEqual(response_next, 7)
+        self.assertEqual(list(batch.ids), [1])
+        self.assertEqual(batch[0].article, 'a')
+
+    def test_streamed_page(self):
+        body = {'next': 7, 'orders': [
+            {'id': order_id, 'convertedPrice': 100, 'article': 'a', 'createdAt': '2024-01-01T00:00:00Z'}
+            for order_id in range(3)
+        ]}
+        client = WBApiClient()
+        with mock.patch.object(client, 'make_request', return_value=make_response(body)) as make_request:
+            batch, response_next = client.get_orders_batch(limit=3, stream=True)
+        self.assertTrue(make_request.call_args.kwargs['stream'])
+        self.assertEqual(response_next, 7)
+        self.assertEqual(list(batch.ids), [0, 1, 2])
+
+    def test_error_in_body(self):
+        with self.assertRaises(WBAPIError):
+            OrderBatch.from_json(json.dumps({'code': 'IncorrectParameter', 'message': 'Некорректный параметр'}))
+
+
+def make_qr_code(order_id: int, image: bytes) -> OrderQRCode:
+    return OrderQRCode(orderId=order_id, file=b64encode(image).decode(), partA='123', partB=str(order_id))
+
+
+class StickerCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_round_trip_and_lazy_directory(self):
+        cache = StickerCache(os.path.join(self.directory, 'stickers'))
+        self.assertFalse(os.path.exists(cache.directory))
+        self.assertIsNone(cache.get(1))
+
+        cache.set(make_qr_code(1, b'image'))
+        qr_code = cache.get(1)
+        self.assertEqual(qr_code, make_qr_code(1, b'image'))
+        self.assertTrue(cache.contains(1))
+
+    def test_eviction_removes_orders_of_evicted_images(self):
+        cache = StickerCache(self.directory, max_size=250)
+        for order_id in range(3):
+            image = bytes([order_id]) * 100
+            cache.set(make_qr_code(order_id, image))
+            # Время изменения картинки служит отметкой обращения, разводим его явно
+            content_hash = json.loads(cache._get_order_path(order_id).read_bytes())['sha256']
+            if cache._get_blob_path(content_hash).exists():
+                os.utime(cache._get_blob_path(content_hash), (order_id, order_id))
+
+        # Третья картинка превысила лимит: вытесняется самая старая вместе со ссылающимся на нее заказом
+        self.assertFalse(cache.contains(0))
+        self.assertTrue(cache.contains(1))
+        self.assertTrue(cache.contains(2))
+        self.assertEqual(len(list(cache._blobs_dir.glob('*/*.orders'))), 2)
+
+    def test_partial_batch_results_are_cached(self):
+        client = WBApiClient()
+        cache = StickerCache(self.directory)
+        cache.set(make_qr_code(1, b'cached'))
+        error = PartialBatchError([make_qr_code(2, b'fetched')], [([3], ConnectionError())])
+        with mock.patch.object(client, 'sticker_cache', cache), \
+                mock.patch('wb.wb_api.client.fan_out', side_effect=error), \
+                self.assertRaises(PartialBatchError) as raised:
+            client.get_qr_codes_for_orders([1, 2, 3])
+
+        self.assertTrue(cache.contains(2))
+        self.assertEqual([qr_code.order_id for qr_code in raised.exception.results], [1, 2])
+
+    def test_remove_refs_keeps_rewritten_orders(self):
+        cache = StickerCache(self.directory)
+        cache.set(make_qr_code(1, b'old'))
+        cache.set(make_qr_code(2, b'old'))
+        old_hash = json.loads(cache._get_order_path(1).read_bytes())['sha256']
+        # Заказ 2 получил новый стикер, ссылка на старую картинку у него больше не действует
+        cache.set(make_qr_code(2, b'new'))
+
+        cache._remove_refs(old_hash)
+        self.assertFalse(cache.contains(1))
+        self.assertTrue(cache.contains(2))
+        self.assertFalse(cache._get_refs_path(old_hash).exists())
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def test_merges_shard_and_web_dumps(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        dump_file = os.path.join(directory.name, 'metrics.prom')
+        registry = MetricsRegistry()
+        registry.register(Counter('wb_api_retries_total', 'Повторы')).inc()
+        registry.dump(dump_file)
+        registry.dump(get_shard_dump_path(dump_file, 1), {'shard': 1})
+        registry.dump(get_web_dump_path(dump_file), {'process': 'web'})
+
+        with override_settings(WB_METRICS_DUMP_FILE=dump_file):
+            response = self.client.get('/metrics')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines.count('# TYPE wb_api_retries_total counter'), 1)
+        self.assertIn('wb_api_retries_total 1', lines)
+        self.assertIn('wb_api_retries_total{shard="1"} 1', lines)
+        self.assertIn('wb_api_retries_total{process="web"} 1', lines)
+
+
+class OneAtATimeTests(SimpleTestCase):
+
+    def test_wait_is_bounded_by_deadline(self):
+        calls = []
+
+        @one_at_a_time
+        def sync_mirror():
+            calls.append(1)
+            return True
+
+        # Синхронизацию держит другой процесс: ждем только до дедлайна и отдаем зеркало как есть
+        with _process_lock(f'{sync_mirror.__module__}.{sync_mirror.__name__}'):
+            started_at = time.monotonic()
+            with deadline(0.2):
+                self.assertFalse(sync_mirror())
+            self.assertLess(time.monotonic() - started_at, 1)
+        self.assertEqual(calls, [])
+
+        self.assertTrue(sync_mirror())
+        self.assertEqual(calls, [1])
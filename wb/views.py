@@ -1,3 +1,32 @@
-from django.shortcuts import render
+import time
+from pathlib import Path
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse
+
+from wb.wb_api.metrics import registry, merge_dumps, get_web_dump_path
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics(request):
+    # С WB работает процесс бота, поэтому отдаем его последний дамп, если он настроен.
+    # Шарды и веб-процесс в режиме вебхука пишут свои дампы рядом. Берем только недавно обновленные,
+    # чтобы не смешать дампы прошлого запуска с другим числом шардов
+    if settings.WB_METRICS_DUMP_FILE:
+        dump_file = Path(settings.WB_METRICS_DUMP_FILE)
+        fresh_after = time.time() - settings.WB_METRICS_DUMP_INTERVAL * 10
+        dumps = [
+            path
+            for path in [
+                dump_file,
+                *sorted(dump_file.parent.glob(f'{dump_file.name}.shard*')),
+                get_web_dump_path(dump_file)
+            ]
+            if path.exists() and path.stat().st_mtime > fresh_after
+        ]
+        return HttpResponse(
+            merge_dumps([path.read_text() for path in dumps]) if dumps else '',
+            content_type=PROMETHEUS_CONTENT_TYPE
+        )
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
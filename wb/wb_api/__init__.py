@@ -1,2 +1,3 @@
 from .client import WBApiClient
+from .async_client import AsyncWBApiClient
 from .errors import WBAPIError, AuthError
\ No newline at end of file
@@ -0,0 +1,306 @@
+import asyncio
+import time
+from typing import AsyncGenerator
+
+import httpx
+
+from . import metrics
+from .batching import async_fan_out
+from .circuit_breaker import CircuitBreaker
+from .client import WB_API_URL
+from .deadline import time_left
+from .errors import (
+    check_response,
+    check_deadline,
+    decode_response,
+    async_retry_on_network_error,
+    AuthError,
+    DeadlineExceeded,
+    PartialBatchError
+)
+from .rate_limiter import RateLimiter
+from .sticker_cache import StickerCache
+from .types import (
+    Supply,
+    Order,
+    Product,
+    OrderQRCode,
+    SupplyQRCode,
+    OrderStatus,
+    OrdersPage,
+    SuppliesPage,
+    StickersPage,
+    OrderStatusesPage
+)
+
+
+class AsyncWBApiClient:
+
+    def __init__(
+            self,
+            token: str,
+            base_url: str = WB_API_URL,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            timeout: tuple[float, float] = (3.05, 30),
+            max_parallel_chunks: int = 4,
+            rate_limiter: RateLimiter | None = None,
+            circuit_breaker: CircuitBreaker | None = None,
+            sticker_cache: StickerCache | None = None
+    ):
+        if not token:
+            raise AuthError('WBClient is not initialised')
+        self._timeout = timeout
+        self._max_parallel_chunks = max_parallel_chunks
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.sticker_cache = sticker_cache
+        connect_timeout, read_timeout = timeout
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={'Authorization': token},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    @async_retry_on_network_error
+    async def make_request(self, method: str, url: str, headers_extra: dict = None, **kwargs) -> httpx.Response:
+        acquire_started_at = time.monotonic()
+        acquired = await self.rate_limiter.async_acquire(url, timeout=time_left())
+        metrics.record_rate_limit_wait(url, time.monotonic() - acquire_started_at)
+        if not acquired:
+            raise DeadlineExceeded('Истекло время на выполнение запроса к WB')
+        check_deadline()
+        self.circuit_breaker.before_call()
+        started_at = time.monotonic()
+        try:
+            response = await self._client.request(
+                method,
+                url,
+                headers=headers_extra,
+                timeout=self._get_timeout(),
+                **kwargs
+            )
+        except httpx.TransportError as ex:
+            self.circuit_breaker.record_failure()
+            metrics.record_request_error(method, url, ex)
+            raise
+        metrics.record_response(
+            method,
+            url,
+            response.status_code,
+            time.monotonic() - started_at,
+            len(response.request.content),
+            len(response.content),
+            response.headers
+        )
+        self.rate_limiter.update(url, response.status_code, response.headers)
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        check_response(response)
+        return response
+
+    def _get_timeout(self) -> httpx.Timeout:
+        connect_timeout, read_timeout = self._timeout
+        if (left := time_left()) is not None:
+            connect_timeout, read_timeout = min(connect_timeout, left), min(read_timeout, left)
+        return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    async def get_supply_orders(self, supply_id: str) -> list[Order]:
+        response = await self.make_request(
+            'get',
+            f'/api/v3/supplies/{supply_id}/orders'
+        )
+        orders = decode_response(response, OrdersPage).orders
+        for order in orders:
+            order.supply_id = supply_id
+        return orders
+
+    async def get_supply(self, supply_id: str) -> Supply:
+        response = await self.make_request(
+            'get',
+            f'/api/v3/supplies/{supply_id}'
+        )
+        return decode_response(response, Supply)
+
+    async def get_products(self, articles: set[str]) -> AsyncGenerator[Product, None]:
+        limit = 100
+        payload = {
+            "settings": {
+                "cursor": {
+                    "limit": limit
+                },
+                "filter": {
+                    "withPhoto": -1
+                }
+            }
+        }
+        while articles:
+            response = await self.make_request(
+                'post',
+                '/content/v2/get/cards/list',
+                json=payload,
+            )
+            data = decode_response(response)
+            for product_card in data['cards']:
+                if product_card['vendorCode'] in articles:
+                    yield Product.parse_from_card(product_card)
+                    articles.remove(product_card['vendorCode'])
+                    if not articles:
+                        return
+            if data['cursor']['total'] < limit:
+                return
+            payload['settings']['cursor']['updatedAt'] = data['cursor']['updatedAt']
+            payload['settings']['cursor']['nmID'] = data['cursor']['nmID']
+
+    async def get_supplies(self, limit: int = 1000, next: int = 0) -> tuple[list[Supply], int]:  # noqa
+        params = {
+            'limit': limit,
+            'next': next
+        }
+        response = await self.make_request(
+            'get',
+            '/api/v3/supplies',
+            params=params
+        )
+        supplies_page = decode_response(response, SuppliesPage)
+        return supplies_page.supplies, supplies_page.next
+
+    async def get_qr_codes_for_orders(self, order_ids: list[int]) -> list[OrderQRCode]:
+        params = {
+            'type': 'png',
+            'width': 58,
+            'height': 40
+        }
+
+        async def get_chunk_stickers(chunk: list[int]) -> list[OrderQRCode]:
+            response = await self.make_request(
+                'post',
+                '/api/v3/orders/stickers',
+                json={'orders': chunk},
+                params=params
+            )
+            return decode_response(response, StickersPage).stickers
+
+        if self.sticker_cache is None:
+            return await async_fan_out(get_chunk_stickers, order_ids, 100, self._max_parallel_chunks)
+
+        # Кэш читает и пишет файлы, поэтому уводим его из цикла событий в поток
+        qr_codes = await asyncio.to_thread(self.sticker_cache.get_many, order_ids)
+        missing_order_ids = [order_id for order_id in order_ids if order_id not in qr_codes]
+        if missing_order_ids:
+            try:
+                fetched_qr_codes = await async_fan_out(
+                    get_chunk_stickers,
+                    missing_order_ids,
+                    100,
+                    self._max_parallel_chunks
+                )
+            except PartialBatchError as ex:
+                await asyncio.to_thread(self.sticker_cache.set_many, ex.results)
+                qr_codes.update((qr_code.order_id, qr_code) for qr_code in ex.results)
+                ex.results = [qr_codes[order_id] for order_id in order_ids if order_id in qr_codes]
+                raise
+            await asyncio.to_thread(self.sticker_cache.set_many, fetched_qr_codes)
+            qr_codes.update((qr_code.order_id, qr_code) for qr_code in fetched_qr_codes)
+        return [qr_codes[order_id] for order_id in order_ids if order_id in qr_codes]
+
+    async def send_supply_to_deliver(self, supply_id: str) -> bool:
+        response = await self.make_request(
+            'patch',
+            f'/api/v3/supplies/{supply_id}/deliver'
+        )
+        decode_response(response)
+        return response.is_success
+
+    async def get_supply_qr_code(self, supply_id: str) -> SupplyQRCode:
+        response = await self.make_request(
+            'get',
+            f'/api/v3/supplies/{supply_id}/barcode',
+            params={
+                'type': 'png',
+                'width': 58,
+                'height': 40
+            }
+        )
+        return decode_response(response, SupplyQRCode)
+
+    async def get_new_orders(self) -> list[Order]:
+        response = await self.make_request(
+            'get',
+            '/api/v3/orders/new'
+        )
+        return decode_response(response, OrdersPage).orders
+
+    async def get_orders(
+            self,
+            next: int = 0,  # noqa
+            limit: int = 100,
+            datestamp_from: int = None,
+            datestamp_to: int = None
+    ) -> tuple[list[Order], int]:
+        params = {
+            'next': next,
+            'limit': limit
+        }
+        if datestamp_from:
+            params['dateFrom'] = datestamp_from
+        if datestamp_to:
+            params['dateTo'] = datestamp_to
+        response = await self.make_request(
+            'get',
+            '/api/v3/orders',
+            params=params
+        )
+        orders_page = decode_response(response, OrdersPage)
+        return orders_page.orders, orders_page.next
+
+    async def add_order_to_supply(self, supply_id: str, order_id: int | str) -> bool:
+        response = await self.make_request(
+            'patch',
+            f'/api/v3/supplies/{supply_id}/orders/{order_id}'
+        )
+        decode_response(response)
+        return response.is_success
+
+    async def create_new_supply(self, supply_name: str) -> str:
+        response = await self.make_request(
+            'post',
+            '/api/v3/supplies',
+            json={'name': supply_name}
+        )
+        return decode_response(response).get('id')
+
+    async def delete_supply_by_id(self, supply_id: str) -> bool:
+        response = await self.make_request(
+            'delete',
+            f'/api/v3/supplies/{supply_id}'
+        )
+        decode_response(response)
+        return response.is_success
+
+    async def check_orders_status(self, order_ids: list[int]) -> AsyncGenerator[OrderStatus, None]:
+        async def get_chunk_statuses(chunk: list[int]) -> list[OrderStatus]:
+            response = await self.make_request(
+                'post',
+                '/api/v3/orders/status',
+                json={"orders": chunk}
+            )
+            return decode_response(response, OrderStatusesPage).orders
+
+        for order_status in await async_fan_out(get_chunk_statuses, order_ids, 1000, self._max_parallel_chunks):
+            yield order_status
@@ -0,0 +1,91 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Iterable, Generator, Awaitable
+
+import more_itertools
+
+from .errors import PartialBatchError
+
+
+def iter_fan_out(
+        func: Callable[[list], list],
+        items: Iterable,
+        chunk_size: int,
+        max_workers: int = 4
+) -> Generator[list, None, None]:
+    # Чанки уходят параллельно, результаты отдаются в исходном порядке.
+    # Ошибки отдельных чанков собираются и поднимаются одним PartialBatchError в конце.
+    # Если чанк один или не удался ни один, поднимается исходная ошибка
+    chunks = list(more_itertools.chunked(items, chunk_size))
+    results = []
+    failed_chunks = []
+    if max_workers <= 1 or len(chunks) <= 1:
+        futures_or_chunks = chunks
+        executor = None
+    else:
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)))
+        # Копия контекста нужна, чтобы в потоках действовал дедлайн вызывающего кода
+        futures_or_chunks = [executor.submit(copy_context().run, func, chunk) for chunk in chunks]
+
+    try:
+        for chunk, job in zip(chunks, futures_or_chunks):
+            try:
+                chunk_result = job.result() if executor else func(job)
+            except Exception as ex:
+                failed_chunks.append((chunk, ex))
+                continue
+            results.extend(chunk_result)
+            yield chunk_result
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    _raise_failed(chunks, results, failed_chunks)
+
+
+def _raise_failed(chunks: list, results: list, failed_chunks: list[tuple[list, Exception]]):
+    if not failed_chunks:
+        return
+    if len(failed_chunks) == len(chunks):
+        # Частичного результата нет, вызывающему коду полезнее исходное исключение
+        raise failed_chunks[0][1]
+    raise PartialBatchError(results, failed_chunks)
+
+
+def fan_out(
+        func: Callable[[list], list],
+        items: Iterable,
+        chunk_size: int,
+        max_workers: int = 4
+) -> list:
+    results = []
+    for chunk_result in iter_fan_out(func, items, chunk_size, max_workers):
+        results.extend(chunk_result)
+    return results
+
+
+async def async_fan_out(
+        func: Callable[[list], Awaitable[list]],
+        items: Iterable,
+        chunk_size: int,
+        max_concurrency: int = 4
+) -> list:
+    chunks = list(more_itertools.chunked(items, chunk_size))
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def run(chunk):
+        async with semaphore:
+            return await func(chunk)
+
+    chunk_results = await asyncio.gather(*map(run, chunks), return_exceptions=True)
+
+    results = []
+    failed_chunks = []
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        if isinstance(chunk_result, Exception):
+            failed_chunks.append((chunk, chunk_result))
+        else:
+            results.extend(chunk_result)
+    _raise_failed(chunks, results, failed_chunks)
+    return results
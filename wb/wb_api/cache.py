@@ -0,0 +1,71 @@
+import copy
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Hashable
+
+
+class TTLCache:
+    # LRU-кэш ограниченного размера, у каждой записи свой срок жизни
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        with self._lock:
+            if key not in self._data:
+                return False, None
+            expires_at, value = self._data[key]
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        with self._lock:
+            now = time.monotonic()
+            # Истекшие записи, которые больше никто не запрашивает, иначе занимали бы память до вытеснения
+            for expired_key in [cached_key for cached_key, (expires_at, _) in self._data.items() if expires_at < now]:
+                del self._data[expired_key]
+            self._data[key] = (now + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *key_prefix):
+        with self._lock:
+            for key in [key for key in self._data if key[:len(key_prefix)] == key_prefix]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def cached(func):
+    # Ключ кэша - имя метода и его аргументы, время жизни берется из настроек клиента.
+    # Аргументы раскладываются по сигнатуре, чтобы вызовы с именованными аргументами
+    # давали тот же ключ, что и позиционные, и сбрасывались invalidate
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        ttl = self.cache_ttls.get(func.__name__)
+        if not ttl:
+            return func(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__, *list(bound.arguments.values())[1:])
+        hit, value = self.response_cache.get(key)
+        if not hit:
+            value = func(self, *args, **kwargs)
+            self.response_cache.set(key, value, ttl)
+        # Глубокая копия, чтобы изменения в моделях ответа у вызывающего кода не попадали в кэш
+        return copy.deepcopy(value)
+
+    return wrapper
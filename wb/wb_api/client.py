@@ -1,11 +1,59 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import suppress
+from contextvars import copy_context
 from pprint import pprint
-from typing import Generator
+from typing import Callable, Generator
 
-import more_itertools
-from requests import Response, request
+from requests import Response, RequestException
 
-from .errors import check_response, retry_on_network_error, AuthError
-from .types import Supply, Order, Product, OrderQRCode, SupplyQRCode, OrderStatus
+from . import metrics
+from .batching import fan_out, iter_fan_out
+from .cache import TTLCache, cached
+from .circuit_breaker import CircuitBreaker
+from .coalescing import SingleFlight
+from .deadline import time_left
+from .errors import (
+    check_response,
+    check_deadline,
+    decode_response,
+    retry_on_network_error,
+    AuthError,
+    DeadlineExceeded,
+    PartialBatchError,
+    WBAPIError
+)
+from .hedging import LatencyTracker, HedgeBudget
+from .pagination import iter_cursor, iter_streamed_cursor
+from .rate_limiter import RateLimiter, DEFAULT_RATE_LIMITS
+from .session import create_session
+from .sticker_cache import StickerCache
+from .streaming import StreamedPage
+from .types import (
+    Supply,
+    Order,
+    Product,
+    OrderQRCode,
+    SupplyQRCode,
+    OrderStatus,
+    OrdersPage,
+    SuppliesPage,
+    StickersPage,
+    OrderStatusesPage,
+    OrderBatch,
+    BulkResult
+)
+
+WB_API_URL = 'https://suppliers-api.wildberries.ru'
+
+# Время жизни ответов в кэше, секунды
+DEFAULT_CACHE_TTLS = {
+    'get_supply': 30,
+    'get_supply_orders': 30,
+    'get_new_orders': 10,
+    'get_supply_qr_code': 3600,
+}
 
 
 class WBApiClient:
@@ -16,132 +64,383 @@ class WBApiClient:
             cls.instance = super().__new__(cls)
         return cls.instance
 
-    def __init__(self, token=None):
+    def __init__(
+            self,
+            token=None,
+            base_url: str = WB_API_URL,
+            pool_connections: int = 10,
+            pool_maxsize: int = 10,
+            timeout: tuple[float, float] = (3.05, 30),
+            host_pool_sizes: dict[str, int] | None = None,
+            max_parallel_chunks: int = 4,
+            rate_limits: dict[str, float] | None = None,
+            hedge_min_delay: float | None = 1.,
+            hedge_max_ratio: float = 0.1,
+            circuit_failure_threshold: int = 5,
+            circuit_recovery_timeout: float = 30,
+            cache_ttls: dict[str, float] | None = None,
+            cache_max_size: int = 1024,
+            sticker_cache_dir: str | None = None,
+            sticker_cache_max_size: int = 256 * 1024 * 1024
+    ):
         if not hasattr(self, '_token'):
             if token:
                 self._token = token
+                self.base_url = base_url.rstrip('/')
+                self._timeout = timeout
+                self._max_parallel_chunks = max_parallel_chunks
+                self._hedge_min_delay = hedge_min_delay
+                self._hedge_budget = HedgeBudget(hedge_max_ratio)
+                self._hedge_executor = ThreadPoolExecutor(max_workers=pool_maxsize)
+                self._rate_limits = DEFAULT_RATE_LIMITS | (rate_limits or {})
+                self.rate_limiter = RateLimiter(self._rate_limits)
+                self.latency_tracker = LatencyTracker()
+                self.circuit_breaker = CircuitBreaker(circuit_failure_threshold, circuit_recovery_timeout)
+                self.cache_ttls = DEFAULT_CACHE_TTLS | (cache_ttls or {})
+                self.response_cache = TTLCache(cache_max_size)
+                self.single_flight = SingleFlight()
+                self.sticker_cache = StickerCache(sticker_cache_dir, sticker_cache_max_size) \
+                    if sticker_cache_dir else None
+                self._session = create_session(
+                    pool_connections=pool_connections,
+                    pool_maxsize=pool_maxsize,
+                    timeout=timeout,
+                    host_pool_sizes=host_pool_sizes
+                )
             else:
                 raise AuthError('WBClient is not initialised')
 
+    def warm_up(self, connections: int = 1):
+        # Заранее открываем соединения, чтобы первые запросы не тратили время на TCP+TLS
+        def open_connection(_):
+            with suppress(RequestException):
+                self._session.head(self.base_url)
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(open_connection, range(connections)))
+
+    def split_between_processes(self, processes: int):
+        # Лимиты WB действуют на весь ключ API, поэтому при работе в нескольких процессах каждый получает свою долю.
+        # Кэш ответов сбрасывается изменениями только в своем процессе и в других отдавал бы устаревшие
+        # составы поставок и новые заказы, поэтому он выключается
+        if processes <= 1:
+            return
+        self.rate_limiter = RateLimiter({
+            group: requests_per_minute / processes
+            for group, requests_per_minute in self._rate_limits.items()
+        })
+        self.cache_ttls = {}
+        self.response_cache.clear()
+
+    def add_response_hook(self, hook: Callable[..., Response | None]):
+        # Хуки вызываются requests для каждого полученного ответа, например для записи ответов WB
+        self._session.hooks['response'].append(hook)
+
+    def make_request(
+            self,
+            method: str,
+            url: str,
+            headers_extra: dict = None,
+            hedge: bool = False,
+            **kwargs
+    ) -> Response:
+        if method != 'get' or kwargs.get('stream'):
+            return self._make_request(method, url, headers_extra, hedge, **kwargs)
+
+        # Одинаковые GET-запросы от разных пользователей склеиваются в один
+        key = (
+            url,
+            tuple(sorted((kwargs.get('params') or {}).items())),
+            tuple(sorted((headers_extra or {}).items()))
+        )
+        return self.single_flight.do(key, self._make_request, method, url, headers_extra, hedge, **kwargs)
+
     @retry_on_network_error
-    def make_request(self, method: str, url: str, headers_extra: dict = None, **kwargs) -> Response:
+    def _make_request(
+            self,
+            method: str,
+            url: str,
+            headers_extra: dict = None,
+            hedge: bool = False,
+            **kwargs
+    ) -> Response:
         headers = {'Authorization': self._token}
         if headers_extra:
             headers.update(headers_extra)
-        response = request(method, url, headers=headers, **kwargs)
+        if hedge and method == 'get' and self._hedge_min_delay is not None:
+            response = self._send_hedged(method, url, headers=headers, **kwargs)
+        else:
+            response = self._send(method, url, headers=headers, **kwargs)
         check_response(response)
         return response
 
+    def _get_timeout(self) -> tuple[float, float]:
+        connect_timeout, read_timeout = self._timeout
+        left = time_left()
+        if left is None:
+            return self._timeout
+        return min(connect_timeout, left), min(read_timeout, left)
+
+    def _send(self, method: str, url: str, started: threading.Event | None = None, **kwargs) -> Response:
+        acquire_started_at = time.monotonic()
+        acquired = self.rate_limiter.acquire(url, timeout=time_left())
+        metrics.record_rate_limit_wait(url, time.monotonic() - acquire_started_at)
+        if not acquired:
+            raise DeadlineExceeded('Истекло время на выполнение запроса к WB')
+        check_deadline()
+        self.circuit_breaker.before_call()
+        started_at = time.monotonic()
+        if started is not None:
+            started.set()
+        try:
+            response = self._session.request(method, url, timeout=self._get_timeout(), **kwargs)
+        except RequestException as ex:
+            self.circuit_breaker.record_failure()
+            metrics.record_request_error(method, url, ex)
+            raise
+        elapsed = time.monotonic() - started_at
+        self.latency_tracker.add(url, elapsed)
+        if kwargs.get('stream'):
+            # Тело потокового ответа еще не прочитано, берем его размер из заголовка
+            content_length = response.headers.get('Content-Length')
+            received_bytes = int(content_length) if content_length else None
+        else:
+            received_bytes = len(response.content)
+        metrics.record_response(
+            method,
+            url,
+            response.status_code,
+            elapsed,
+            len(response.request.body or b''),
+            received_bytes,
+            response.headers
+        )
+        self.rate_limiter.update(url, response.status_code, response.headers)
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return response
+
+    def _send_hedged(self, method: str, url: str, **kwargs) -> Response:
+        # Если ответ задерживается дольше обычного p95, отправляем дубль запроса
+        # и берем тот ответ, который придет первым
+        p95 = self.latency_tracker.get_p95(url)
+        if p95 is None:
+            return self._send(method, url, **kwargs)
+        self._hedge_budget.record_request()
+
+        # Отсчет до дубля идет с момента отправки запроса: ожидание свободного потока в пуле
+        # и лимита запросов под нагрузкой не должно само по себе порождать дубли
+        started = threading.Event()
+        first = self._hedge_executor.submit(copy_context().run, self._send, method, url, started=started, **kwargs)
+        first.add_done_callback(lambda _: started.set())
+        started.wait()
+        done, _ = wait([first], timeout=max(p95, self._hedge_min_delay))
+        if done or not self._hedge_budget.try_spend():
+            return first.result()
+
+        second = self._hedge_executor.submit(copy_context().run, self._send, method, url, **kwargs)
+        error = None
+        for future in as_completed([first, second]):
+            try:
+                return future.result()
+            except Exception as ex:
+                error = ex
+        raise error
+
+    @cached
     def get_supply_orders(self, supply_id: str) -> list[Order]:
         response = self.make_request(
             'get',
-            f'https://suppliers-api.wildberries.ru/api/v3/supplies/{supply_id}/orders'
+            f'{self.base_url}/api/v3/supplies/{supply_id}/orders',
+            hedge=True
         )
-        orders = [Order.model_validate(order) for order in response.json()['orders']]
+        orders = decode_response(response, OrdersPage).orders
         for order in orders:
             order.supply_id = supply_id
         return orders
 
+    @cached
     def get_supply(self, supply_id: str) -> Supply:
         response = self.make_request(
             'get',
-            f'https://suppliers-api.wildberries.ru/api/v3/supplies/{supply_id}'
+            f'{self.base_url}/api/v3/supplies/{supply_id}',
+            hedge=True
         )
-        return Supply.model_validate(response.json())
+        return decode_response(response, Supply)
 
-    def get_products(self, articles: set[str]) -> Generator[Product, None, None]:
-        limit = 100
-        payload = {
+    @staticmethod
+    def _get_product_cards_payload(cursor: dict | None, limit: int, ascending: bool) -> dict:
+        return {
             "settings": {
+                "sort": {
+                    "ascending": ascending
+                },
                 "cursor": {
-                    "limit": limit
+                    "limit": limit,
+                    **(cursor or {})
                 },
                 "filter": {
                     "withPhoto": -1
                 }
             }
         }
-        while True:
-            response = self.make_request(
-                'post',
-                'https://suppliers-api.wildberries.ru/content/v2/get/cards/list',
-                json=payload,
+
+    def get_product_cards(
+            self,
+            cursor: dict | None = None,
+            limit: int = 100,
+            ascending: bool = False
+    ) -> tuple[list[dict], dict]:
+        response = self.make_request(
+            'post',
+            f'{self.base_url}/content/v2/get/cards/list',
+            json=self._get_product_cards_payload(cursor, limit, ascending),
+        )
+        data = decode_response(response)
+        return data['cards'], data['cursor']
+
+    def stream_product_cards(
+            self,
+            cursor: dict | None = None,
+            limit: int = 100,
+            ascending: bool = False
+    ) -> StreamedPage:
+        response = self.make_request(
+            'post',
+            f'{self.base_url}/content/v2/get/cards/list',
+            json=self._get_product_cards_payload(cursor, limit, ascending),
+            stream=True
+        )
+        return StreamedPage(response, 'cards', dict)
+
+    def iter_product_cards(
+            self,
+            cursor: dict | None = None,
+            limit: int = 100,
+            ascending: bool = False,
+            stream: bool = False,
+            **kwargs
+    ) -> Generator[dict, None, None]:
+        def get_next_cursor(response_cursor: dict) -> dict | None:
+            if response_cursor['total'] < limit:
+                return None
+            return {
+                'updatedAt': response_cursor['updatedAt'],
+                'nmID': response_cursor['nmID']
+            }
+
+        if stream:
+            return iter_streamed_cursor(
+                lambda page_cursor: self.stream_product_cards(page_cursor, limit, ascending),
+                lambda page: get_next_cursor(page.meta['cursor']),
+                cursor
             )
-            data = response.json()
-            for product_card in data['cards']:
-                if product_card['vendorCode'] in articles:
-                    yield Product.parse_from_card(product_card)
-                    articles.remove(product_card['vendorCode'])
-                    if not articles:
-                        break
-            else:
-                if data['cursor']['total'] < limit:
-                    break
-                else:
-                    payload['settings']['cursor']['updatedAt'] = data['cursor']['updatedAt']
-                    payload['settings']['cursor']['nmID'] = data['cursor']['nmID']
 
-    def get_supplies(self, limit: int = 1000, next: int = 0) -> tuple[list[Supply], int]:
+        def fetch_page(page_cursor: dict | None) -> tuple[list[dict], dict | None]:
+            product_cards, response_cursor = self.get_product_cards(page_cursor, limit, ascending)
+            return product_cards, get_next_cursor(response_cursor)
+
+        return iter_cursor(fetch_page, cursor, **kwargs)
+
+    def get_products(self, articles: set[str]) -> Generator[Product, None, None]:
+        if not articles:
+            return
+        for product_card in self.iter_product_cards(stream=True):
+            if product_card['vendorCode'] in articles:
+                yield Product.parse_from_card(product_card)
+                articles.remove(product_card['vendorCode'])
+                if not articles:
+                    return
+
+    def get_supplies(self, limit: int = 1000, next: int = 0) -> tuple[list[Supply], int]:  # noqa
         params = {
             'limit': limit,
             'next': next
         }
         response = self.make_request(
             'get',
-            'https://suppliers-api.wildberries.ru/api/v3/supplies',
+            f'{self.base_url}/api/v3/supplies',
             params=params
         )
-        supplies = [
-            Supply.model_validate(supply)
-            for supply in response.json()['supplies']
-        ]
-        return supplies, next
+        supplies_page = decode_response(response, SuppliesPage)
+        return supplies_page.supplies, supplies_page.next
+
+    def iter_supplies(self, limit: int = 1000, next: int = 0, **kwargs) -> Generator[Supply, None, None]:  # noqa
+        def fetch_page(page_next: int) -> tuple[list[Supply], int | None]:
+            supplies, response_next = self.get_supplies(limit, page_next)
+            return supplies, response_next if len(supplies) == limit else None
+
+        return iter_cursor(fetch_page, next, **kwargs)
 
     def get_qr_codes_for_orders(self, order_ids: list[int]) -> list[OrderQRCode]:
-        stickers = []
         params = {
             'type': 'png',
             'width': 58,
             'height': 40
         }
-        for chunk in more_itertools.chunked(order_ids, 100):
+
+        def get_chunk_stickers(chunk: list[int]) -> list[OrderQRCode]:
             response = self.make_request(
                 'post',
-                'https://suppliers-api.wildberries.ru/api/v3/orders/stickers',
+                f'{self.base_url}/api/v3/orders/stickers',
                 json={'orders': chunk},
                 params=params
             )
-            stickers.extend([OrderQRCode.model_validate(sticker) for sticker in response.json()['stickers']])
-        return stickers
+            return decode_response(response, StickersPage).stickers
+
+        if self.sticker_cache is None:
+            return fan_out(get_chunk_stickers, order_ids, 100, self._max_parallel_chunks)
+
+        # Стикеры уже виденных заказов берем с диска, у WB запрашиваем только новые
+        qr_codes = self.sticker_cache.get_many(order_ids)
+        missing_order_ids = [order_id for order_id in order_ids if order_id not in qr_codes]
+        if missing_order_ids:
+            try:
+                fetched_qr_codes = fan_out(get_chunk_stickers, missing_order_ids, 100, self._max_parallel_chunks)
+            except PartialBatchError as ex:
+                # Удачные чанки тоже сохраняем, чтобы повтор не запрашивал их у WB заново
+                self.sticker_cache.set_many(ex.results)
+                qr_codes.update((qr_code.order_id, qr_code) for qr_code in ex.results)
+                ex.results = [qr_codes[order_id] for order_id in order_ids if order_id in qr_codes]
+                raise
+            self.sticker_cache.set_many(fetched_qr_codes)
+            qr_codes.update((qr_code.order_id, qr_code) for qr_code in fetched_qr_codes)
+        return [qr_codes[order_id] for order_id in order_ids if order_id in qr_codes]
 
     def send_supply_to_deliver(self, supply_id: str) -> bool:
         response = self.make_request(
             'patch',
-            f'https://suppliers-api.wildberries.ru/api/v3/supplies/{supply_id}/deliver'
+            f'{self.base_url}/api/v3/supplies/{supply_id}/deliver'
         )
+        decode_response(response)
+        self.response_cache.invalidate('get_supply', supply_id)
+        self.response_cache.invalidate('get_supply_orders', supply_id)
+        self.response_cache.invalidate('get_supply_qr_code', supply_id)
         return response.ok
 
+    @cached
     def get_supply_qr_code(self, supply_id: str) -> SupplyQRCode:
         response = self.make_request(
             'get',
-            f'https://suppliers-api.wildberries.ru/api/v3/supplies/{supply_id}/barcode',
+            f'{self.base_url}/api/v3/supplies/{supply_id}/barcode',
             params={
                 'type': 'png',
                 'width': 58,
                 'height': 40
             }
         )
-        return SupplyQRCode.model_validate(response.json())
+        return decode_response(response, SupplyQRCode)
 
+    @cached
     def get_new_orders(self) -> list[Order]:
         response = self.make_request(
             'get',
-            'https://suppliers-api.wildberries.ru/api/v3/orders/new'
+            f'{self.base_url}/api/v3/orders/new',
+            hedge=True
         )
-        return [
-            Order.model_validate(order)
-            for order in response.json()['orders']
-        ]
+        return decode_response(response, OrdersPage).orders
 
     def get_orders(
             self,
@@ -160,44 +459,156 @@ class WBApiClient:
             params['dateTo'] = datestamp_to
         response = self.make_request(
             'get',
-            'https://suppliers-api.wildberries.ru/api/v3/orders',
+            f'{self.base_url}/api/v3/orders',
             params=params
         )
-        response_content = response.json()
-        orders = [
-            Order.model_validate(order)
-            for order in response_content['orders']
-        ]
-        return orders, response_content['next']
+        orders_page = decode_response(response, OrdersPage)
+        return orders_page.orders, orders_page.next
+
+    def get_orders_batch(
+            self,
+            next: int = 0,  # noqa
+            limit: int = 1000,
+            datestamp_from: int = None,
+            datestamp_to: int = None,
+            stream: bool = False
+    ) -> tuple[OrderBatch, int]:
+        params = {
+            'next': next,
+            'limit': limit
+        }
+        if datestamp_from:
+            params['dateFrom'] = datestamp_from
+        if datestamp_to:
+            params['dateTo'] = datestamp_to
+        response = self.make_request(
+            'get',
+            f'{self.base_url}/api/v3/orders',
+            params=params,
+            stream=stream
+        )
+        if not stream:
+            return OrderBatch.from_json(response.content)
+
+        # Заказы складываются в колонки по одному, не дожидаясь разбора всей страницы
+        page = StreamedPage(response, 'orders', dict)
+        batch = OrderBatch()
+        batch.extend(page)
+        return batch, page.meta.get('next', 0)
+
+    def stream_orders(
+            self,
+            next: int = 0,  # noqa
+            limit: int = 1000,
+            datestamp_from: int = None,
+            datestamp_to: int = None
+    ) -> StreamedPage:
+        params = {
+            'next': next,
+            'limit': limit
+        }
+        if datestamp_from:
+            params['dateFrom'] = datestamp_from
+        if datestamp_to:
+            params['dateTo'] = datestamp_to
+        response = self.make_request(
+            'get',
+            f'{self.base_url}/api/v3/orders',
+            params=params,
+            stream=True
+        )
+        return StreamedPage(response, 'orders', Order.model_validate)
+
+    def iter_orders(
+            self,
+            next: int = 0,  # noqa
+            limit: int = 1000,
+            datestamp_from: int = None,
+            datestamp_to: int = None,
+            stream: bool = False,
+            **kwargs
+    ) -> Generator[Order, None, None]:
+        if stream:
+            return iter_streamed_cursor(
+                lambda page_next: self.stream_orders(page_next, limit, datestamp_from, datestamp_to),
+                lambda page: page.meta['next'] if page.count == limit else None,
+                next
+            )
+
+        def fetch_page(page_next: int) -> tuple[list[Order], int | None]:
+            orders, response_next = self.get_orders(page_next, limit, datestamp_from, datestamp_to)
+            return orders, response_next if len(orders) == limit else None
+
+        return iter_cursor(fetch_page, next, **kwargs)
 
     def add_order_to_supply(self, supply_id: str, order_id: int | str) -> int:
         response = self.make_request(
             'patch',
-            f'https://suppliers-api.wildberries.ru/api/v3/supplies/{supply_id}/orders/{order_id}'
+            f'{self.base_url}/api/v3/supplies/{supply_id}/orders/{order_id}'
         )
+        decode_response(response)
+        self.response_cache.invalidate('get_supply', supply_id)
+        # Заказ мог переехать из другой поставки, поэтому сбрасываем составы всех поставок
+        self.response_cache.invalidate('get_supply_orders')
+        self.response_cache.invalidate('get_new_orders')
         return response.ok
 
+    def add_orders_to_supply(
+            self,
+            supply_id: str,
+            order_ids: list[int],
+            progress: Callable[[int, int], None] | None = None,
+            max_workers: int | None = None
+    ) -> BulkResult:
+        # Заказы добавляются параллельно, общий темп запросов держит RateLimiter
+        result = BulkResult(succeeded=[], failed={})
+        if not order_ids:
+            return result
+        with ThreadPoolExecutor(max_workers=min(max_workers or self._max_parallel_chunks, len(order_ids))) as executor:
+            futures = {
+                executor.submit(copy_context().run, self.add_order_to_supply, supply_id, order_id): order_id
+                for order_id in order_ids
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                order_id = futures[future]
+                try:
+                    if future.result():
+                        result.succeeded.append(order_id)
+                    else:
+                        result.failed[order_id] = WBAPIError('Заказ не добавлен')
+                except Exception as ex:
+                    result.failed[order_id] = ex
+                if progress:
+                    progress(done, len(order_ids))
+        return result
+
     def create_new_supply(self, supply_name: str) -> str:
         response = self.make_request(
             'post',
-            'https://suppliers-api.wildberries.ru/api/v3/supplies',
+            f'{self.base_url}/api/v3/supplies',
             json={'name': supply_name}
         )
-        return response.json().get('id')
+        return decode_response(response).get('id')
 
     def delete_supply_by_id(self, supply_id: str) -> int:
         response = self.make_request(
             'delete',
-            f'https://suppliers-api.wildberries.ru/api/v3/supplies/{supply_id}'
+            f'{self.base_url}/api/v3/supplies/{supply_id}'
         )
+        decode_response(response)
+        self.response_cache.invalidate('get_supply', supply_id)
+        self.response_cache.invalidate('get_supply_orders', supply_id)
+        self.response_cache.invalidate('get_supply_qr_code', supply_id)
         return response.ok
 
     def check_orders_status(self, order_ids: list[int]) -> Generator[OrderStatus, None, None]:
-        for chunk in more_itertools.chunked(order_ids, 1000):
+        def get_chunk_statuses(chunk: list[int]) -> list[OrderStatus]:
             response = self.make_request(
                 'post',
-                'https://suppliers-api.wildberries.ru/api/v3/orders/status',
+                f'{self.base_url}/api/v3/orders/status',
                 json={"orders": chunk}
             )
-            for order in response.json()['orders']:
-                yield OrderStatus.model_validate(order)
+            return decode_response(response, OrderStatusesPage).orders
+
+        for chunk_statuses in iter_fan_out(get_chunk_statuses, order_ids, 1000, self._max_parallel_chunks):
+            yield from chunk_statuses
@@ -0,0 +1,47 @@
+import threading
+from typing import Any, Callable, Hashable
+
+from .deadline import time_left
+from .errors import DeadlineExceeded
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    # Одинаковые запросы, пришедшие одновременно, выполняются один раз,
+    # а результат получают все, кто его ждал
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            if not call.done.wait(timeout=time_left()):
+                raise DeadlineExceeded('Истекло время на выполнение запроса к WB')
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,28 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_deadline: ContextVar[float | None] = ContextVar('wb_api_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds: float | None):
+    # Вложенный дедлайн не может быть позже внешнего
+    if seconds is None:
+        yield
+        return
+    new_deadline = time.monotonic() + seconds
+    if (current_deadline := _deadline.get()) is not None:
+        new_deadline = min(new_deadline, current_deadline)
+    token = _deadline.set(new_deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> float | None:
+    current_deadline = _deadline.get()
+    if current_deadline is None:
+        return None
+    return current_deadline - time.monotonic()
@@ -0,0 +1,13 @@
+import re
+from urllib.parse import urlparse
+
+_ID_SEGMENT = re.compile(r'^(WB-GI-\d+|\d+)$')
+
+
+def get_endpoint_template(url: str) -> str:
+    # /api/v3/supplies/WB-GI-1234/orders -> /api/v3/supplies/{id}/orders
+    path = urlparse(url).path
+    return '/'.join(
+        '{id}' if _ID_SEGMENT.match(segment) else segment
+        for segment in path.split('/')
+    )
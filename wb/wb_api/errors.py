@@ -1,8 +1,19 @@
+import asyncio
+import inspect
+import json
 import time
 from datetime import datetime
+from functools import wraps
 
+import httpx
+from pydantic import BaseModel, ValidationError
 from requests import Response
-from requests.exceptions import ChunkedEncodingError, JSONDecodeError, HTTPError
+from requests.exceptions import ChunkedEncodingError, HTTPError, ConnectionError
+
+from . import metrics
+from .deadline import time_left
+
+MAX_ATTEMPTS_WITHOUT_DEADLINE = 10
 
 
 class AuthError(Exception):
@@ -19,44 +30,147 @@ class WBAPIError(Exception):
         return f'{self.code}: {self.message}' if self.code else self.message
 
 
-def check_response(response: Response):
+class PartialBatchError(WBAPIError):
+    def __init__(self, results: list, failed_chunks: list[tuple[list, Exception]]):
+        failed_items = sum(len(chunk) for chunk, _ in failed_chunks)
+        super().__init__(f'{len(failed_chunks)} chunks ({failed_items} items) failed')
+        self.results = results
+        self.failed_chunks = failed_chunks
+
+
+class DeadlineExceeded(WBAPIError):
+    pass
+
+
+class CircuitOpenError(WBAPIError):
+    pass
+
+
+def check_deadline(delay: float = 0):
+    left = time_left()
+    if left is not None and left <= delay:
+        raise DeadlineExceeded('Истекло время на выполнение запроса к WB')
+
+
+def check_response(response: Response | httpx.Response):
+    # Тело ответа проверяется на ошибки WB в decode_response, чтобы не разбирать JSON дважды
     response.raise_for_status()
+
+
+def decode_response(response: Response | httpx.Response, model: type[BaseModel] | None = None):
+    if model is None:
+        try:
+            response_json = json.loads(response.content)
+        except ValueError:
+            return None
+        check_response_json(response_json)
+        return response_json
+
     try:
-        response_json = response.json()
-    except (AttributeError, JSONDecodeError):
+        return model.model_validate_json(response.content)
+    except ValidationError:
+        # Тело не подошло под схему - возможно, WB вернул ошибку в успешном ответе
+        try:
+            response_json = json.loads(response.content)
+        except ValueError:
+            raise
+        check_response_json(response_json)
+        raise
+
+
+def check_response_json(response_json):
+    if not isinstance(response_json, dict):
         return
-    else:
-        if response_json.keys() == ('code', 'message'):
-            raise WBAPIError(
-                code=response_json['code'],
-                message=response_json['message']
-            )
-        if response_json.get('error'):
-            raise WBAPIError(
-                message=f'{response_json["errorText"]}: {response_json["additionalErrors"]}'
-            )
+    if response_json.keys() == {'code', 'message'}:
+        raise WBAPIError(
+            code=response_json['code'],
+            message=response_json['message']
+        )
+    if response_json.get('error'):
+        raise WBAPIError(
+            message=f'{response_json["errorText"]}: {response_json["additionalErrors"]}'
+        )
+
+
+def _get_retry_delay(last_error_timestamp: float, delay: float) -> float:
+    right_now = datetime.now().timestamp()
+    return min(
+        0 if right_now - last_error_timestamp > 60 else delay,
+        10
+    )
+
+
+def _is_last_attempt(attempt: int) -> bool:
+    # С дедлайном повторяем, пока есть время, без него - ограниченное число раз
+    return time_left() is None and attempt >= MAX_ATTEMPTS_WITHOUT_DEADLINE
+
+
+def _get_request_url(signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    return signature.bind(*args, **kwargs).arguments.get('url', '')
 
 
 def retry_on_network_error(func):
+    signature = inspect.signature(func)
+
+    @wraps(func)
     def wrapper(*args, **kwargs):
         last_error_timestamp = 0
         delay = 0
+        attempt = 0
         while True:
+            check_deadline()
+            attempt += 1
             try:
                 return func(*args, **kwargs)
-            except (ChunkedEncodingError, ConnectionError):
-                pass
+            except (ChunkedEncodingError, ConnectionError) as ex:
+                if _is_last_attempt(attempt):
+                    raise
+                metrics.record_retry(_get_request_url(signature, args, kwargs), type(ex).__name__)
             except HTTPError as ex:
-                if '504' not in str(ex):
+                status_code = ex.response.status_code if ex.response is not None else None
+                if status_code not in (429, 504) or _is_last_attempt(attempt):
                     raise
+                metrics.record_retry(_get_request_url(signature, args, kwargs), str(status_code))
+                if status_code == 429:
+                    continue  # Паузу выдержит RateLimiter перед следующим запросом
 
-            right_now = datetime.now().timestamp()
-            delay = min(
-                0 if right_now - last_error_timestamp > 60 else delay,
-                10
-            )
+            delay = _get_retry_delay(last_error_timestamp, delay)
+            check_deadline(delay)
             last_error_timestamp = datetime.now().timestamp()
             time.sleep(delay)
             delay += 2
 
     return wrapper
+
+
+def async_retry_on_network_error(func):
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        last_error_timestamp = 0
+        delay = 0
+        attempt = 0
+        while True:
+            check_deadline()
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except httpx.TransportError as ex:
+                if _is_last_attempt(attempt):
+                    raise
+                metrics.record_retry(_get_request_url(signature, args, kwargs), type(ex).__name__)
+            except httpx.HTTPStatusError as ex:
+                if ex.response.status_code not in (429, 504) or _is_last_attempt(attempt):
+                    raise
+                metrics.record_retry(_get_request_url(signature, args, kwargs), str(ex.response.status_code))
+                if ex.response.status_code == 429:
+                    continue  # Паузу выдержит RateLimiter перед следующим запросом
+
+            delay = _get_retry_delay(last_error_timestamp, delay)
+            check_deadline(delay)
+            last_error_timestamp = datetime.now().timestamp()
+            await asyncio.sleep(delay)
+            delay += 2
+
+    return wrapper
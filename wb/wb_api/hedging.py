@@ -0,0 +1,47 @@
+import statistics
+import threading
+from collections import defaultdict, deque
+
+from .endpoints import get_endpoint_template
+
+
+class LatencyTracker:
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def add(self, url: str, latency: float):
+        with self._lock:
+            self._latencies[get_endpoint_template(url)].append(latency)
+
+    def get_p95(self, url: str) -> float | None:
+        with self._lock:
+            latencies = list(self._latencies[get_endpoint_template(url)])
+        if len(latencies) < self.min_samples:
+            return None
+        return statistics.quantiles(latencies, n=20)[-1]
+
+
+class HedgeBudget:
+    # Ограничивает долю запросов, для которых отправляется дубль: каждый запрос добавляет ratio токена,
+    # дубль тратит целый. Под нагрузкой, когда медленными становятся все запросы, дубли быстро кончаются
+    # и не удваивают нагрузку на WB
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
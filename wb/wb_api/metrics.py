@@ -0,0 +1,227 @@
+import os
+import threading
+from bisect import bisect_left
+from pathlib import Path
+
+from .endpoints import get_endpoint_template
+from .rate_limiter import get_endpoint_group
+
+DEFAULT_BUCKETS = (.025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple, extra: str = '') -> str:
+    labels = [
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values)
+    ]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _get_key(self, labels: dict) -> tuple:
+        return tuple(labels[name] for name in self.label_names)
+
+    def collect(self, extra_labels: str = '') -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            lines.extend(self._collect_value(key, value, extra_labels))
+        return lines
+
+    def _collect_value(self, key: tuple, value, extra_labels: str) -> list[str]:
+        return [f'{self.name}{_format_labels(self.label_names, key, extra_labels)} {value}']
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._get_key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._get_key(labels)
+        with self._lock:
+            # Счетчики по корзинам, сумма и количество наблюдений
+            bucket_counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.)
+            bucket_counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (bucket_counts, total + value)
+
+    def _collect_value(self, key: tuple, value, extra_labels: str) -> list[str]:
+        bucket_counts, total = value
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip((*self.buckets, '+Inf'), bucket_counts):
+            cumulative += count
+            bucket_labels = ','.join(filter(None, (extra_labels, f'le="{upper_bound}"')))
+            labels = _format_labels(self.label_names, key, bucket_labels)
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.label_names, key, extra_labels)
+        lines.append(f'{self.name}_sum{labels} {total}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, labels: dict | None = None) -> str:
+        # labels добавляются ко всем значениям, например номер шарда, чтобы дампы процессов не пересекались
+        extra_labels = _format_labels(tuple(labels), tuple(labels.values()))[1:-1] if labels else ''
+        return '\n'.join(line for metric in self.metrics for line in metric.collect(extra_labels)) + '\n'
+
+    def dump(self, path: str | Path, labels: dict | None = None):
+        # Пишем во временный файл и подменяем, чтобы читатель не получил файл наполовину
+        path = Path(path)
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        tmp_path.write_text(self.render(labels))
+        os.replace(tmp_path, path)
+
+
+def get_shard_dump_path(path: str | Path, shard: int) -> Path:
+    path = Path(path)
+    return path.with_name(f'{path.name}.shard{shard}')
+
+
+def get_web_dump_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f'{path.name}.web')
+
+
+def merge_dumps(texts: list[str]) -> str:
+    # Объединяет дампы нескольких процессов: значения одной метрики должны идти одной группой
+    # под общими HELP и TYPE
+    families: dict[str, list[str]] = {}
+    for text in texts:
+        name = None
+        for line in text.splitlines():
+            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                name = line.split()[2]
+                family = families.setdefault(name, [])
+                if line not in family:
+                    family.append(line)
+            elif line and name is not None:
+                families[name].append(line)
+    return '\n'.join(line for family in families.values() for line in family) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.register(Histogram(
+    'wb_api_request_duration_seconds',
+    'Время ответа WB API',
+    ('method', 'endpoint')
+))
+responses = registry.register(Counter(
+    'wb_api_responses_total',
+    'Ответы WB API по кодам',
+    ('method', 'endpoint', 'status')
+))
+request_errors = registry.register(Counter(
+    'wb_api_request_errors_total',
+    'Запросы к WB API, не получившие ответа',
+    ('method', 'endpoint', 'error')
+))
+retries = registry.register(Counter(
+    'wb_api_retries_total',
+    'Повторы запросов к WB API',
+    ('endpoint', 'reason')
+))
+request_bytes = registry.register(Counter(
+    'wb_api_request_bytes_total',
+    'Отправлено байт в теле запросов к WB API',
+    ('method', 'endpoint')
+))
+response_bytes = registry.register(Counter(
+    'wb_api_response_bytes_total',
+    'Получено байт в теле ответов WB API',
+    ('method', 'endpoint')
+))
+ratelimit_remaining = registry.register(Gauge(
+    'wb_api_ratelimit_remaining',
+    'Остаток квоты по последнему заголовку X-Ratelimit-Remaining',
+    ('group',)
+))
+ratelimit_wait = registry.register(Counter(
+    'wb_api_ratelimit_wait_seconds_total',
+    'Сколько секунд запросы ждали своей очереди в RateLimiter',
+    ('group',)
+))
+
+
+def record_response(
+        method: str,
+        url: str,
+        status_code: int,
+        elapsed: float,
+        sent_bytes: int,
+        received_bytes: int | None,
+        headers
+):
+    endpoint = get_endpoint_template(url)
+    method = method.upper()
+    request_duration.observe(elapsed, method=method, endpoint=endpoint)
+    responses.inc(method=method, endpoint=endpoint, status=status_code)
+    request_bytes.inc(sent_bytes, method=method, endpoint=endpoint)
+    if received_bytes is not None:
+        response_bytes.inc(received_bytes, method=method, endpoint=endpoint)
+    if (remaining := headers.get('X-Ratelimit-Remaining')) is not None and remaining.isdigit():
+        ratelimit_remaining.set(int(remaining), group=get_endpoint_group(url))
+
+
+def record_request_error(method: str, url: str, error: Exception):
+    request_errors.inc(method=method.upper(), endpoint=get_endpoint_template(url), error=type(error).__name__)
+
+
+def record_retry(url: str, reason: str):
+    retries.inc(endpoint=get_endpoint_template(url), reason=reason)
+
+
+def record_rate_limit_wait(url: str, seconds: float):
+    if seconds:
+        ratelimit_wait.inc(seconds, group=get_endpoint_group(url))
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Callable, Generator, Iterable
+
+# fetch_page получает курсор и возвращает элементы страницы и курсор следующей страницы.
+# Курсор None означает, что страница последняя
+PageFetcher = Callable[[Any], tuple[Iterable, Any]]
+
+
+def iter_cursor(
+        fetch_page: PageFetcher,
+        cursor: Any = None,
+        prefetch: bool = True,
+        until: Callable[[Any], bool] | None = None
+) -> Generator[Any, None, None]:
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        items, next_cursor = fetch_page(cursor)
+        while True:
+            # Пока вызывающий код разбирает текущую страницу, следующая уже загружается
+            next_page = None
+            if executor and next_cursor is not None:
+                next_page = executor.submit(copy_context().run, fetch_page, next_cursor)
+
+            for item in items:
+                yield item
+                if until and until(item):
+                    return
+
+            if next_cursor is None:
+                return
+            items, next_cursor = next_page.result() if next_page else fetch_page(next_cursor)
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_streamed_cursor(
+        open_page: Callable[[Any], Iterable],
+        get_next_cursor: Callable[[Any], Any],
+        cursor: Any = None
+) -> Generator[Any, None, None]:
+    # Курсор потоковой страницы известен только после ее прочтения, поэтому страницы идут по очереди
+    while True:
+        page = open_page(cursor)
+        yield from page
+        cursor = get_next_cursor(page)
+        if cursor is None:
+            return
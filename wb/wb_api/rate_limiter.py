@@ -0,0 +1,112 @@
+import asyncio
+import re
+import threading
+import time
+from contextlib import suppress
+from urllib.parse import urlparse
+
+# Группы методов WB со своими лимитами. Порядок важен: берется первое совпадение
+ENDPOINT_GROUPS = (
+    ('stickers', re.compile(r'^/api/v3/orders/stickers')),
+    ('orders', re.compile(r'^/api/v3/orders')),
+    ('supplies', re.compile(r'^/api/v3/supplies')),
+    ('content', re.compile(r'^/content/')),
+)
+DEFAULT_GROUP = 'other'
+
+# Запросов в минуту
+DEFAULT_RATE_LIMITS = {
+    'stickers': 300,
+    'orders': 300,
+    'supplies': 300,
+    'content': 100,
+    DEFAULT_GROUP: 300,
+}
+
+
+def get_endpoint_group(url: str) -> str:
+    path = urlparse(url).path
+    for group, pattern in ENDPOINT_GROUPS:
+        if pattern.match(path):
+            return group
+    return DEFAULT_GROUP
+
+
+class TokenBucket:
+
+    def __init__(self, requests_per_minute: float, capacity: int | None = None):
+        self.rate = requests_per_minute / 60
+        self.capacity = capacity or max(1, int(self.rate * 10))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        # Возвращает 0, если токен получен, иначе сколько секунд подождать
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        # Как Lock.acquire: False, если токен не получить за timeout секунд. Тогда не ждем вовсе,
+        # чтобы Retry-After на 10 минут не держал обработчик дольше его дедлайна
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while wait := self.try_acquire():
+            if give_up_at is not None and time.monotonic() + wait > give_up_at:
+                return False
+            time.sleep(wait)
+        return True
+
+    async def async_acquire(self, timeout: float | None = None) -> bool:
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while wait := self.try_acquire():
+            if give_up_at is not None and time.monotonic() + wait > give_up_at:
+                return False
+            await asyncio.sleep(wait)
+        return True
+
+    def block(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class RateLimiter:
+
+    def __init__(self, rate_limits: dict[str, float] | None = None):
+        rate_limits = DEFAULT_RATE_LIMITS | (rate_limits or {})
+        self.buckets = {
+            group: TokenBucket(requests_per_minute)
+            for group, requests_per_minute in rate_limits.items()
+        }
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        return self.buckets.get(get_endpoint_group(url)) or self.buckets[DEFAULT_GROUP]
+
+    def acquire(self, url: str, timeout: float | None = None) -> bool:
+        return self.get_bucket(url).acquire(timeout)
+
+    async def async_acquire(self, url: str, timeout: float | None = None) -> bool:
+        return await self.get_bucket(url).async_acquire(timeout)
+
+    def update(self, url: str, status_code: int, headers):
+        # WB сообщает о лимитах через заголовки X-Ratelimit-*, при 429 еще и через Retry-After
+        retry_after = None
+        with suppress(TypeError, ValueError):
+            retry_after = float(headers.get('Retry-After') or headers.get('X-Ratelimit-Retry'))
+        if retry_after is None and headers.get('X-Ratelimit-Remaining') == '0':
+            with suppress(TypeError, ValueError):
+                retry_after = float(headers.get('X-Ratelimit-Reset'))
+
+        if retry_after is not None:
+            self.get_bucket(url).block(retry_after)
+        elif status_code == 429:
+            self.get_bucket(url).block(1)
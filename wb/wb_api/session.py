@@ -0,0 +1,38 @@
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+
+    def __init__(self, *args, timeout: tuple[float, float] | None = None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        timeout: tuple[float, float] | None = None,
+        host_pool_sizes: dict[str, int] | None = None
+) -> Session:
+    session = Session()
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        timeout=timeout
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    # Для отдельных хостов можно держать пул побольше
+    for host, pool_size in (host_pool_sizes or {}).items():
+        session.mount(
+            f'https://{host}',
+            TimeoutHTTPAdapter(pool_connections=1, pool_maxsize=pool_size, timeout=timeout)
+        )
+    return session
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from base64 import b64decode, b64encode
+from contextlib import suppress
+from pathlib import Path
+
+from .types import OrderQRCode
+
+
+class StickerCache:
+    # Стикер заказа после выдачи не меняется, поэтому храним его на диске без срока жизни.
+    # orders/<id>.json ссылается на картинку по хэшу содержимого, сами PNG лежат в blobs/,
+    # а рядом с картинкой в <хэш>.orders перечислены ссылающиеся на нее заказы.
+    # Когда картинки занимают больше max_size байт, удаляются те, к которым дольше всего не обращались.
+    # Каталоги создаются при первой записи
+
+    def __init__(self, directory: str | Path, max_size: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self._orders_dir = self.directory / 'orders'
+        self._blobs_dir = self.directory / 'blobs'
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self._blobs_dir.glob('*/*.png'))
+
+    def _get_order_path(self, order_id: int) -> Path:
+        return self._orders_dir / f'{order_id}.json'
+
+    def _get_blob_path(self, content_hash: str) -> Path:
+        return self._blobs_dir / content_hash[:2] / f'{content_hash}.png'
+
+    def _get_refs_path(self, content_hash: str) -> Path:
+        return self._blobs_dir / content_hash[:2] / f'{content_hash}.orders'
+
+    @staticmethod
+    def _write_atomic(path: Path, content: bytes):
+        tmp_path = path.with_name(f'.{path.name}.{threading.get_ident()}.tmp')
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    def get(self, order_id: int) -> OrderQRCode | None:
+        try:
+            entry = json.loads(self._get_order_path(order_id).read_bytes())
+            blob_path = self._get_blob_path(entry['sha256'])
+            image = blob_path.read_bytes()
+        except (OSError, ValueError, KeyError):
+            return None
+        if hashlib.sha256(image).hexdigest() != entry['sha256']:
+            return None
+        # Время изменения файла служит отметкой последнего обращения для вытеснения.
+        # Картинку могли вытеснить сразу после чтения, тогда отметка уже не нужна
+        with suppress(OSError):
+            os.utime(blob_path)
+        return OrderQRCode(
+            orderId=order_id,
+            file=b64encode(image).decode(),
+            partA=entry['partA'],
+            partB=entry['partB']
+        )
+
+    def contains(self, order_id: int) -> bool:
+        return self._get_order_path(order_id).exists()
+
+    def get_many(self, order_ids: list[int]) -> dict[int, OrderQRCode]:
+        qr_codes = {}
+        for order_id in order_ids:
+            if qr_code := self.get(order_id):
+                qr_codes[order_id] = qr_code
+        return qr_codes
+
+    def set(self, qr_code: OrderQRCode):
+        image = b64decode(qr_code.file, validate=True)
+        content_hash = hashlib.sha256(image).hexdigest()
+        blob_path = self._get_blob_path(content_hash)
+        with self._lock:
+            if not blob_path.exists():
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                self._write_atomic(blob_path, image)
+                self._size += len(image)
+            with self._get_refs_path(content_hash).open('a') as refs_file:
+                refs_file.write(f'{qr_code.order_id}\n')
+            # Запись заказа под блокировкой, чтобы вытеснение не удалило картинку раньше, чем появится ссылка
+            self._orders_dir.mkdir(parents=True, exist_ok=True)
+            entry = {'sha256': content_hash, 'partA': qr_code.part_a, 'partB': qr_code.part_b}
+            self._write_atomic(self._get_order_path(qr_code.order_id), json.dumps(entry).encode())
+        if self._size > self.max_size:
+            self.evict()
+
+    def set_many(self, qr_codes: list[OrderQRCode]):
+        for qr_code in qr_codes:
+            self.set(qr_code)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self._orders_dir, ignore_errors=True)
+            shutil.rmtree(self._blobs_dir, ignore_errors=True)
+            self._size = 0
+
+    def evict(self):
+        # Освобождаем с запасом, чтобы не запускать вытеснение на каждой следующей записи
+        with self._lock:
+            blobs = sorted(
+                ((path.stat(), path) for path in self._blobs_dir.glob('*/*.png')),
+                key=lambda blob: blob[0].st_mtime
+            )
+            self._size = sum(stat.st_size for stat, _ in blobs)
+            for stat, path in blobs:
+                if self._size <= self.max_size * 0.9:
+                    break
+                path.unlink(missing_ok=True)
+                self._size -= stat.st_size
+                self._remove_refs(path.stem)
+
+    def _remove_refs(self, content_hash: str):
+        # Удаляет заказы, ссылающиеся на вытесненную картинку, кроме тех, что успели перезаписать на другую
+        refs_path = self._get_refs_path(content_hash)
+        try:
+            order_ids = refs_path.read_text().split()
+        except OSError:
+            order_ids = []
+        for order_id in set(order_ids):
+            order_path = self._get_order_path(int(order_id))
+            try:
+                entry_hash = json.loads(order_path.read_bytes())['sha256']
+            except (OSError, ValueError, KeyError):
+                continue
+            if entry_hash == content_hash:
+                order_path.unlink(missing_ok=True)
+        refs_path.unlink(missing_ok=True)
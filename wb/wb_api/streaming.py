@@ -0,0 +1,49 @@
+from typing import Any, Callable, Iterator
+
+import ijson
+from requests import Response
+
+from .errors import check_response_json
+
+
+class StreamedPage:
+    # Элементы страницы разбираются и отдаются по мере чтения ответа,
+    # поэтому в памяти одновременно находится только один элемент.
+    # Остальные поля ответа (курсор и т.п.) доступны в meta после того, как страница прочитана
+
+    def __init__(self, response: Response, items_key: str, parse_item: Callable[[dict], Any]):
+        self.items_key = items_key
+        self.parse_item = parse_item
+        self.meta = {}
+        self.count = 0
+        response.raw.decode_content = True
+        self._items = self._parse(response)
+
+    def __iter__(self) -> Iterator:
+        return self._items
+
+    def _parse(self, response: Response) -> Iterator:
+        item_prefix = f'{self.items_key}.item'
+        item_builder = None
+        try:
+            for prefix, event, value in ijson.parse(response.raw, use_float=True):
+                if prefix == item_prefix or prefix.startswith(f'{item_prefix}.'):
+                    if item_builder is None:
+                        item_builder = ijson.ObjectBuilder()
+                    item_builder.event(event, value)
+                    if prefix == item_prefix and event in ('end_map', 'end_array'):
+                        self.count += 1
+                        yield self.parse_item(item_builder.value)
+                        item_builder = None
+                elif prefix and event in ('number', 'string', 'boolean', 'null'):
+                    self._set_meta(prefix, value)
+        finally:
+            response.close()
+        check_response_json(self.meta)
+
+    def _set_meta(self, prefix: str, value: Any):
+        *path, key = prefix.split('.')
+        target = self.meta
+        for path_key in path:
+            target = target.setdefault(path_key, {})
+        target[key] = value
@@ -1,9 +1,14 @@
-from datetime import datetime
+import json
+import sys
+from array import array
+from datetime import datetime, timezone
 from dataclasses import dataclass
-from typing import Any
+from typing import Iterable, Iterator
 
 from pydantic import BaseModel, Field
 
+from .errors import check_response_json
+
 
 class Supply(BaseModel):
     id: str
@@ -23,18 +28,88 @@ class Order(BaseModel):
     converted_price: int = Field(alias='convertedPrice')
     article: str
     created_at: datetime = Field(alias='createdAt')
-    created_ago: str | None = Field(default=None, exclude=True)
 
-    def model_post_init(self, __context: Any) -> None:
+    @property
+    def created_ago(self) -> str:
+        # Считается только при показе заказа, а не при разборе ответа
         created_ago = datetime.now().timestamp() - self.created_at.timestamp()
         hours, seconds = divmod(int(created_ago), 3600)
         minutes, seconds = divmod(seconds, 60)
-        self.created_ago = f'{hours:02.0f}ч. {minutes:02.0f}м.'
+        return f'{hours:02.0f}ч. {minutes:02.0f}м.'
 
     def __str__(self):
         return f'{self.article} | {self.created_ago}'
 
 
+class OrderBatch:
+    # Компактное хранение большого числа заказов по колонкам.
+    # Объекты Order создаются только при обращении к конкретному заказу
+    __slots__ = ('ids', 'converted_prices', 'created_at', 'articles', 'supply_ids')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.converted_prices = array('q')
+        self.created_at = array('d')
+        self.articles: list[str] = []
+        self.supply_ids: list[str] = []
+
+    @classmethod
+    def from_json(cls, content: bytes | str) -> tuple['OrderBatch', int]:
+        response_content = json.loads(content)
+        # Тело разбираем один раз: ошибку WB ищем в уже готовом словаре
+        check_response_json(response_content)
+        batch = cls()
+        batch.extend(response_content['orders'])
+        return batch, response_content.get('next', 0)
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[Order]) -> 'OrderBatch':
+        batch = cls()
+        for order in orders:
+            batch.ids.append(order.id)
+            batch.converted_prices.append(order.converted_price)
+            batch.created_at.append(order.created_at.timestamp())
+            batch.articles.append(sys.intern(order.article))
+            batch.supply_ids.append(sys.intern(order.supply_id or ''))
+        return batch
+
+    def extend(self, raw_orders: Iterable[dict]):
+        for raw_order in raw_orders:
+            self.ids.append(raw_order['id'])
+            self.converted_prices.append(raw_order['convertedPrice'])
+            self.created_at.append(
+                datetime.fromisoformat(raw_order['createdAt'].replace('Z', '+00:00')).timestamp()
+            )
+            # Артикулы и поставки сильно повторяются, храним по одной копии строки
+            self.articles.append(sys.intern(raw_order['article']))
+            self.supply_ids.append(sys.intern(raw_order.get('supplyId') or ''))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Order:
+        return Order.model_construct(
+            id=self.ids[index],
+            supply_id=self.supply_ids[index],
+            converted_price=self.converted_prices[index],
+            article=self.articles[index],
+            created_at=datetime.fromtimestamp(self.created_at[index], tz=timezone.utc)
+        )
+
+    def __iter__(self) -> Iterator[Order]:
+        return (self[index] for index in range(len(self)))
+
+
+class OrdersPage(BaseModel):
+    orders: list[Order]
+    next: int = 0
+
+
+class SuppliesPage(BaseModel):
+    supplies: list[Supply]
+    next: int = 0
+
+
 class OrderStatus(BaseModel):
     id: int
     supplier_status: str = Field(alias='supplierStatus')
@@ -48,11 +123,25 @@ class OrderQRCode(BaseModel):
     part_b: str = Field(alias='partB')
 
 
+class OrderStatusesPage(BaseModel):
+    orders: list[OrderStatus]
+
+
+class StickersPage(BaseModel):
+    stickers: list[OrderQRCode]
+
+
 class SupplyQRCode(BaseModel):
     barcode: str
     image_string: str = Field(alias='file')
 
 
+@dataclass
+class BulkResult:
+    succeeded: list[int]
+    failed: dict[int, Exception]
+
+
 @dataclass
 class Product:
     article: str
@@ -76,6 +165,7 @@ class Product:
             article=product_card.get('vendorCode', ''),
             name=product_card.get('title', ''),
             barcode=barcode,
+            brand=product_card.get('brand', ''),
             colors=characteristics.get('Цвет', []),
             countries=characteristics.get('Страна производства', []),
             media_files=product_card.get('mediaFiles', [])
@@ -28,7 +28,50 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = env('SECRET_KEY')
 TG_TOKEN = env('TG_TOKEN')
-WBApiClient(token=env('WB_API_KEY'))
+WB_API_KEY = env('WB_API_KEY')
+
+WB_API_BASE_URL = env('WB_API_BASE_URL', 'https://suppliers-api.wildberries.ru')
+WB_API_POOL_CONNECTIONS = env.int('WB_API_POOL_CONNECTIONS', 10)
+WB_API_POOL_MAXSIZE = env.int('WB_API_POOL_MAXSIZE', 10)
+WB_API_HOST_POOL_SIZES = env.dict('WB_API_HOST_POOL_SIZES', subcast_values=int, default={})
+WB_API_CONNECT_TIMEOUT = env.float('WB_API_CONNECT_TIMEOUT', 3.05)
+WB_API_READ_TIMEOUT = env.float('WB_API_READ_TIMEOUT', 30)
+WB_API_PREWARM_CONNECTIONS = env.int('WB_API_PREWARM_CONNECTIONS', 0)
+WB_API_MAX_PARALLEL_CHUNKS = env.int('WB_API_MAX_PARALLEL_CHUNKS', 4)
+WB_API_RATE_LIMITS = env.dict('WB_API_RATE_LIMITS', subcast_values=float, default={})
+WB_API_HEDGE_MIN_DELAY = env.float('WB_API_HEDGE_MIN_DELAY', 1.) if env.bool('WB_API_HEDGING', True) else None
+WB_API_HEDGE_MAX_RATIO = env.float('WB_API_HEDGE_MAX_RATIO', 0.1)
+WB_API_CIRCUIT_FAILURE_THRESHOLD = env.int('WB_API_CIRCUIT_FAILURE_THRESHOLD', 5)
+WB_API_CIRCUIT_RECOVERY_TIMEOUT = env.float('WB_API_CIRCUIT_RECOVERY_TIMEOUT', 30)
+WB_API_CACHE_TTLS = env.dict('WB_API_CACHE_TTLS', subcast_values=float, default={})
+WB_API_CACHE_MAX_SIZE = env.int('WB_API_CACHE_MAX_SIZE', 1024)
+WB_API_RECORD_DIR = env('WB_API_RECORD_DIR', None)
+WB_STICKER_CACHE_DIR = env('WB_STICKER_CACHE_DIR', str(BASE_DIR / 'sticker_cache')) or None
+WB_STICKER_CACHE_MAX_SIZE = env.int('WB_STICKER_CACHE_MAX_SIZE', 256 * 1024 * 1024)
+WB_METRICS_DUMP_FILE = env('WB_METRICS_DUMP_FILE', None)
+WB_METRICS_DUMP_INTERVAL = env.int('WB_METRICS_DUMP_INTERVAL', 15)
+WBApiClient(
+    token=WB_API_KEY,
+    base_url=WB_API_BASE_URL,
+    pool_connections=WB_API_POOL_CONNECTIONS,
+    pool_maxsize=WB_API_POOL_MAXSIZE,
+    timeout=(WB_API_CONNECT_TIMEOUT, WB_API_READ_TIMEOUT),
+    host_pool_sizes=WB_API_HOST_POOL_SIZES,
+    max_parallel_chunks=WB_API_MAX_PARALLEL_CHUNKS,
+    rate_limits=WB_API_RATE_LIMITS,
+    hedge_min_delay=WB_API_HEDGE_MIN_DELAY,
+    hedge_max_ratio=WB_API_HEDGE_MAX_RATIO,
+    circuit_failure_threshold=WB_API_CIRCUIT_FAILURE_THRESHOLD,
+    circuit_recovery_timeout=WB_API_CIRCUIT_RECOVERY_TIMEOUT,
+    cache_ttls=WB_API_CACHE_TTLS,
+    cache_max_size=WB_API_CACHE_MAX_SIZE,
+    sticker_cache_dir=WB_STICKER_CACHE_DIR,
+    sticker_cache_max_size=WB_STICKER_CACHE_MAX_SIZE
+)
+if WB_API_RECORD_DIR:
+    # Модуль заглушки WB нужен только для записи ответов, поэтому загружаем его, лишь когда запись включена
+    from wb.stand_in import ResponseRecorder
+    WBApiClient().add_response_hook(ResponseRecorder(WB_API_RECORD_DIR))
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env.bool('DEBUG', False)
@@ -141,6 +184,23 @@ else:
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 BOT_PAGINATOR_PAGE_SIZE = 8
+BOT_PAGE_SNAPSHOT_TTL = env.float('BOT_PAGE_SNAPSHOT_TTL', 120)
 BOT_MAX_SUPPLIES_QUANTITY = 40
 BOT_BARCODE_FONT_FILE = 'arial.ttf'
 BOT_BARCODE_FONT_NAME = 'Arial'
+
+BOT_WORKERS = env.int('BOT_WORKERS', 8)
+BOT_ACTION_DEADLINE = env.float('BOT_ACTION_DEADLINE', 60)
+BOT_JOB_DEADLINE = env.float('BOT_JOB_DEADLINE', 600)
+BOT_WEBHOOK_URL = env('BOT_WEBHOOK_URL', None)
+BOT_WEBHOOK_SECRET = env('BOT_WEBHOOK_SECRET', None)
+BOT_UPDATE_QUEUE_SIZE = env.int('BOT_UPDATE_QUEUE_SIZE', 1000)
+BOT_SHARDS = env.int('BOT_SHARDS', 1)
+BOT_SESSION_STORE = env('BOT_SESSION_STORE', 'sqlite')
+BOT_SESSION_DB = env('BOT_SESSION_DB', str(BASE_DIR / 'bot_sessions.sqlite3'))
+BOT_SESSION_MAX_IDLE = env.int('BOT_SESSION_MAX_IDLE', 30 * 24 * 60 * 60)
+
+WB_CATALOG_SYNC_INTERVAL = env.int('WB_CATALOG_SYNC_INTERVAL', 300)
+WB_SUPPLIES_SYNC_INTERVAL = env.int('WB_SUPPLIES_SYNC_INTERVAL', 60)
+WB_ORDERS_SYNC_INTERVAL = env.int('WB_ORDERS_SYNC_INTERVAL', 300)
+WB_ORDERS_SYNC_DAYS = env.int('WB_ORDERS_SYNC_DAYS', 30)
@@ -20,9 +20,14 @@ from django.urls import path, include, reverse_lazy, re_path
 from django.views.generic import RedirectView
 from django.views.static import serve
 
+from tg import views as tg_views
+from wb import views as wb_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('staff/', include('employers.urls')),
+    path('metrics', wb_views.metrics, name='metrics'),
+    path('tg/webhook', tg_views.webhook, name='tg_webhook'),
     path('', RedirectView.as_view(url=reverse_lazy('staff'), permanent=False)),
     re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT})
 ]